@@ -0,0 +1,347 @@
+import os
+import mmap
+import struct
+import marshal
+import hashlib
+import calendar
+import threading
+from datetime import datetime
+
+import events
+from game import GameStatSet
+from formation import Formation
+from player import Player, Keeper
+from stats import TEAM_STATS, TeamStats
+
+
+# Fixed-size index records: md5 of the match id, kickoff as seconds since the
+# epoch (NO_DATE if unknown), home and away team names, then the offset and
+# length of the match's record in the data file.
+INDEX_RECORD = struct.Struct('<16sq40s40sQI')
+NO_DATE = -(2 ** 63)
+
+PLAYER_KINDS = {'P': Player, 'K': Keeper}
+# Player fields added since the format was first written. They go on the
+# end of a player's record, so older archives still decode (without them).
+_LATE_PLAYER_FIELDS = ('page_name',)
+_PLAYER_FIELDS = dict(
+    (kind, tuple(name for klass in reversed(player_class.__mro__)
+                 for name in getattr(klass, '__slots__', ())
+                 if name not in _LATE_PLAYER_FIELDS) + _LATE_PLAYER_FIELDS)
+    for kind, player_class in PLAYER_KINDS.items())
+
+
+def _timestamp(game_date):
+    if game_date is None:
+        return NO_DATE
+    return calendar.timegm(game_date.timetuple())
+
+
+def _match_key(match_id):
+    if isinstance(match_id, unicode):
+        match_id = match_id.encode('utf-8')
+    return hashlib.md5(match_id).digest()
+
+
+def _encode_player(player_obj):
+    kind = 'K' if isinstance(player_obj, Keeper) else 'P'
+    return (kind,) + tuple(
+        getattr(player_obj, name) for name in _PLAYER_FIELDS[kind])
+
+
+def _decode_player(values):
+    # Every field gets set below (late ones only in newer archives), so
+    # there's no need to run __init__
+    player_class = PLAYER_KINDS[values[0]]
+    player_obj = player_class.__new__(player_class)
+    for name in _LATE_PLAYER_FIELDS:
+        setattr(player_obj, name, None)
+    for name, value in zip(_PLAYER_FIELDS[values[0]], values[1:]):
+        setattr(player_obj, name, value)
+    return player_obj
+
+
+def encode_game(game):
+    ''' Serializes a GameStatSet to a compact string. Players are written
+    once, with their team, and referred to by position everywhere else.
+    '''
+    teams = (game.home_team, game.away_team)
+    positions = [dict((id(x), i) for i, x in enumerate(team.players))
+                 for team in teams]
+
+    def side(team):
+        for count, candidate in enumerate(teams):
+            if team is candidate:
+                return count
+
+    def ref(team_side, player_obj):
+        # Players that somehow aren't on the team get written out in full
+        if player_obj is None:
+            return None
+        if team_side is not None and id(player_obj) in positions[team_side]:
+            return positions[team_side][id(player_obj)]
+        return _encode_player(player_obj)
+
+    encoded_teams = []
+    for count, team in enumerate(teams):
+        formation = None
+        if team.formation is not None:
+            formation = [[ref(count, x) for x in line]
+                         for line in team.formation.players]
+        encoded_teams.append((
+            team.name,
+            tuple(getattr(team.stats, attr)
+                  for title, attr, convert in TEAM_STATS),
+            team.stats.other,
+            [[_encode_player(x) for x in players] for players in (
+                team.starters, team.keepers, team.subs)],
+            formation,
+        ))
+
+    goals = []
+    for goal in game.goals:
+        goal_side = side(goal.team)
+        goals.append((
+            goal.time, goal_side, ref(goal_side, goal.player), goal.own_goal,
+            [ref(goal_side, x) for x in goal.assisted_by],
+        ))
+
+    bookings = []
+    for booking in game.disciplinary_events:
+        booking_side = side(booking.team)
+        bookings.append((
+            booking.time, booking_side, ref(booking_side, booking.player),
+            booking.card_color, booking.reason,
+        ))
+
+    subs = []
+    for sub in game.subs:
+        sub_side = side(sub.team)
+        subs.append((
+            sub.time, sub_side, ref(sub_side, sub.player_on),
+            ref(sub_side, sub.player_off),
+        ))
+
+    game_date = None
+    if game.game_date is not None:
+        game_date = game.game_date.timetuple()[:6]
+
+    return marshal.dumps((
+        game.stat_url, game_date, encoded_teams, goals, bookings, subs,
+    ), 2)
+
+
+def decode_game(data):
+    ''' Rebuilds a GameStatSet from a string made by encode_game '''
+    (stat_url, game_date, encoded_teams, goals, bookings,
+     subs) = marshal.loads(data)
+
+    game = GameStatSet(stat_url)
+    if game_date is not None:
+        game.game_date = datetime(*game_date)
+
+    teams = (game.home_team, game.away_team)
+    team_players = []
+    for team, encoded in zip(teams, encoded_teams):
+        name, stat_values, other, player_lists, formation = encoded
+        team.name = name
+        team.stats = TeamStats(**dict(
+            (attr, value) for (title, attr, convert), value
+            in zip(TEAM_STATS, stat_values)))
+        team.stats.other = other
+        team.starters, team.keepers, team.subs = [
+            [_decode_player(x) for x in players] for players in player_lists]
+        players = team.players
+        team_players.append(players)
+        if formation is not None:
+            team.formation = Formation([
+                [_deref(players, x) for x in line] for line in formation])
+
+    def event_team(team_side):
+        return None if team_side is None else teams[team_side]
+
+    def event_player(team_side, value):
+        players = team_players[team_side] if team_side is not None else []
+        return _deref(players, value)
+
+    for time, team_side, scorer, own_goal, assists in goals:
+        goal = events.Goal()
+        goal.time = time
+        goal.team = event_team(team_side)
+        goal.player = event_player(team_side, scorer)
+        goal.own_goal = own_goal
+        goal.assisted_by = [event_player(team_side, x) for x in assists]
+        game.goals.append(goal)
+
+    for time, team_side, booked, card_color, reason in bookings:
+        booking = events.Booking()
+        booking.time = time
+        booking.team = event_team(team_side)
+        booking.player = event_player(team_side, booked)
+        booking.card_color = card_color
+        booking.reason = reason
+        game.disciplinary_events.append(booking)
+
+    for time, team_side, player_on, player_off in subs:
+        sub = events.Substitution()
+        sub.time = time
+        sub.team = event_team(team_side)
+        sub.player_on = event_player(team_side, player_on)
+        sub.player_off = event_player(team_side, player_off)
+        game.subs.append(sub)
+
+    return game
+
+
+def _deref(players, value):
+    if value is None:
+        return None
+    if isinstance(value, tuple):
+        return _decode_player(value)
+    return players[value]
+
+
+class ArchiveEntry(object):
+    ''' One match's line in the archive index '''
+
+    __slots__ = ('key', 'timestamp', 'home_team', 'away_team', 'offset',
+                 'length')
+
+    def __init__(self, key, timestamp, home_team, away_team, offset, length):
+        self.key = key
+        self.timestamp = timestamp
+        self.home_team = home_team
+        self.away_team = away_team
+        self.offset = offset
+        self.length = length
+
+    @property
+    def game_date(self):
+        if self.timestamp == NO_DATE:
+            return None
+        return datetime.utcfromtimestamp(self.timestamp)
+
+
+class MatchArchive(object):
+    ''' An append-only archive of parsed matches on disk.
+
+    Matches are serialized with encode_game and appended to the data file at
+    `path`. Alongside it, `path` + ".idx" holds one fixed-size record per
+    match (see INDEX_RECORD) saying where to find it. Only the index is read
+    when the archive is opened; the data file is memory-mapped and a match
+    is decoded when it's asked for, so loading one match or a few weeks out
+    of several seasons doesn't touch the rest.
+
+    Appending a match whose id is already in the archive supersedes the old
+    copy (which stays in the file). Reading is safe from several threads;
+    appends are serialized.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = '%s.idx' % path
+        self._lock = threading.RLock()
+        self._data = open(path, 'a+b')
+        self._index = open(self.index_path, 'a+b')
+        self._map = None
+        self._entries = {}
+        self._load_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self._data.close()
+            self._index.close()
+
+    def _load_index(self):
+        ''' Reads the index. Anything after the last complete record whose
+        data made it to disk was left by an interrupted append, and is cut
+        off so the next append lines up again.
+        '''
+        data_size = os.fstat(self._data.fileno()).st_size
+        self._index.seek(0)
+        raw = self._index.read()
+        valid_size = 0
+        while valid_size + INDEX_RECORD.size <= len(raw):
+            entry = ArchiveEntry(*INDEX_RECORD.unpack_from(raw, valid_size))
+            if entry.offset + entry.length > data_size:
+                break
+            entry.home_team = entry.home_team.rstrip('\0').decode(
+                'utf-8', 'ignore')
+            entry.away_team = entry.away_team.rstrip('\0').decode(
+                'utf-8', 'ignore')
+            self._entries[entry.key] = entry
+            valid_size += INDEX_RECORD.size
+
+        if valid_size < len(raw):
+            self._index.truncate(valid_size)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, match_id):
+        return _match_key(match_id) in self._entries
+
+    def entries(self):
+        ''' Returns the index entries, ordered by kickoff '''
+        return sorted(self._entries.values(), key=lambda x: x.timestamp)
+
+    def append(self, game, match_id=None):
+        ''' Adds a match to the archive. match_id defaults to the game's
+        stat url.
+        '''
+        match_id = match_id or game.stat_url
+        data = encode_game(game)
+        with self._lock:
+            self._data.seek(0, os.SEEK_END)
+            offset = self._data.tell()
+            self._data.write(data)
+            self._data.flush()
+
+            entry = ArchiveEntry(
+                _match_key(match_id), _timestamp(game.game_date),
+                game.home_team.name or u'', game.away_team.name or u'',
+                offset, len(data))
+            self._index.seek(0, os.SEEK_END)
+            self._index.write(INDEX_RECORD.pack(
+                entry.key, entry.timestamp,
+                entry.home_team.encode('utf-8')[:40],
+                entry.away_team.encode('utf-8')[:40],
+                entry.offset, entry.length))
+            self._index.flush()
+            self._entries[entry.key] = entry
+
+    def _read(self, entry):
+        with self._lock:
+            end = entry.offset + entry.length
+            if self._map is None or len(self._map) < end:
+                if self._map is not None:
+                    self._map.close()
+                self._map = mmap.mmap(
+                    self._data.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._map[entry.offset:end]
+
+    def get(self, match_id):
+        ''' Loads a single match, raising KeyError if it isn't archived '''
+        return decode_game(self._read(self._entries[_match_key(match_id)]))
+
+    def between(self, start=None, end=None):
+        ''' Yields the matches kicking off in [start, end), in kickoff
+        order. Either end of the range can be left open.
+        '''
+        start = _timestamp(start) if start else NO_DATE
+        end = _timestamp(end) if end else None
+        for entry in self.entries():
+            if entry.timestamp < start or entry.timestamp == NO_DATE:
+                continue
+            if end is not None and entry.timestamp >= end:
+                break
+            yield decode_game(self._read(entry))
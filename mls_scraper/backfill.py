@@ -0,0 +1,263 @@
+import time
+import zlib
+import sqlite3
+import traceback
+from multiprocessing.pool import ThreadPool
+
+from archive import encode_game, decode_game
+from parser import MLSStatsParser, SavedPageParser
+
+PENDING = 'pending'
+FETCHED = 'fetched'
+PARSED = 'parsed'
+FAILED = 'failed'
+STATES = (PENDING, FETCHED, PARSED, FAILED)
+
+
+def _compress(data):
+    if data is None:
+        return None
+    return sqlite3.Binary(zlib.compress(data))
+
+
+def _decompress(data):
+    if data is None:
+        return None
+    return zlib.decompress(str(data))
+
+
+def _run_match(args):
+    ''' Worker for BackfillJob.run. Fetches a match's pages unless they were
+    fetched on an earlier run, then parses them unless fetch_only is set.
+
+    Returns (url, stat url, stats html, formation html, encoded game,
+    error), where whatever wasn't reached is None and error is the
+    formatted exception if something went wrong.
+    '''
+    (url, stat_url, stats_html, formation_html, fetch_only, parser_class,
+     parser_kwargs) = args
+    game = None
+    try:
+        if stats_html is None:
+            # Both pages or neither, so a match is never parsed without its
+            # formation
+            stats_parser = parser_class(
+                url, generate_stats=False, **parser_kwargs)
+            fetched = stats_parser._fetch_stat_html()
+            formation_html = stats_parser._fetch_formation_html(
+                stats_parser._get_formation_url())
+            stats_html, stat_url = fetched, stats_parser.stat_url
+
+        if not fetch_only:
+            game = encode_game(SavedPageParser.from_html(
+                stats_html, formation_html, stat_url, **parser_kwargs).game)
+    except Exception:
+        return (url, stat_url, stats_html, formation_html, None,
+                traceback.format_exc())
+    return url, stat_url, stats_html, formation_html, game, None
+
+
+class BackfillJob(object):
+    ''' A resumable scrape of a long list of matches, checkpointed in a
+    single SQLite file at `path`.
+
+    Every url added to the job is tracked with its state (pending, fetched,
+    parsed or failed), how many attempts it's had, and the last error. The
+    fetched pages are kept (compressed) until the match parses, and the
+    parsed game after that, so a job that's interrupted and run again picks
+    up where it left off: parsed matches aren't touched, and fetched ones
+    are parsed without going back to the site. Failed matches are retried
+    on later runs until they've had `max_attempts`.
+
+    Progress is committed every `batch_size` matches. Any other keyword
+    arguments are passed along to the parser.
+    '''
+
+    def __init__(self, path, max_attempts=3, batch_size=50,
+                 parser_class=MLSStatsParser, clock=time.time,
+                 **parser_kwargs):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.parser_class = parser_class
+        self.parser_kwargs = parser_kwargs
+        self.counters = {
+            'fetched': 0,
+            'parsed': 0,
+            'failed': 0,
+            'commits': 0,
+        }
+        self._clock = clock
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS matches ('
+            ' url TEXT PRIMARY KEY,'
+            ' position INTEGER NOT NULL,'
+            ' state TEXT NOT NULL,'
+            ' attempts INTEGER NOT NULL DEFAULT 0,'
+            ' last_error TEXT,'
+            ' stat_url TEXT,'
+            ' stats_html BLOB,'
+            ' formation_html BLOB,'
+            ' game BLOB,'
+            ' updated_at REAL)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS matches_state'
+            ' ON matches (state, position)'
+        )
+        self._conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._conn.close()
+
+    def add(self, urls):
+        ''' Adds urls to the job, skipping any it already has. Returns how
+        many were new.
+        '''
+        position, = self._conn.execute(
+            'SELECT COALESCE(MAX(position), 0) FROM matches').fetchone()
+        added = 0
+        for url in urls:
+            position += 1
+            cursor = self._conn.execute(
+                'INSERT OR IGNORE INTO matches (url, position, state,'
+                ' updated_at) VALUES (?, ?, ?, ?)',
+                (url, position, PENDING, self._clock())
+            )
+            added += cursor.rowcount
+        self._conn.commit()
+        return added
+
+    def counts(self):
+        ''' Returns how many matches are in each state '''
+        counts = dict((x, 0) for x in STATES)
+        counts.update(self._conn.execute(
+            'SELECT state, COUNT(*) FROM matches GROUP BY state'))
+        return counts
+
+    def failures(self):
+        ''' Returns (url, attempts, last error) for every failed match '''
+        return self._conn.execute(
+            'SELECT url, attempts, last_error FROM matches'
+            ' WHERE state = ? ORDER BY position', (FAILED,)
+        ).fetchall()
+
+    def retry_failed(self):
+        ''' Gives failed matches that are out of attempts another go '''
+        self._conn.execute(
+            'UPDATE matches SET attempts = 0 WHERE state = ?', (FAILED,))
+        self._conn.commit()
+
+    def games(self):
+        ''' Yields (url, game) for every parsed match, in the order they
+        were added
+        '''
+        rows = self._conn.execute(
+            'SELECT url, game FROM matches WHERE state = ?'
+            ' ORDER BY position', (PARSED,))
+        for url, game in rows:
+            yield url, decode_game(str(game))
+
+    def _todo(self, fetch_only, limit):
+        states = (PENDING, FAILED) if fetch_only else (
+            PENDING, FETCHED, FAILED)
+        query = (
+            'SELECT url FROM matches'
+            ' WHERE state IN (%s) AND attempts < ? ORDER BY position'
+            % ', '.join('?' * len(states)))
+        params = states + (self.max_attempts,)
+        if limit is not None:
+            query += ' LIMIT ?'
+            params += (limit,)
+        return [url for url, in self._conn.execute(query, params)]
+
+    def _load_tasks(self, urls, fetch_only):
+        ''' Builds the _run_match tasks for urls, loading and decompressing
+        any pages an earlier run saved
+        '''
+        tasks = []
+        for url in urls:
+            stat_url, stats_html, formation_html = self._conn.execute(
+                'SELECT stat_url, stats_html, formation_html FROM matches'
+                ' WHERE url = ?', (url,)
+            ).fetchone()
+            tasks.append((
+                url, stat_url, _decompress(stats_html),
+                _decompress(formation_html), fetch_only, self.parser_class,
+                self.parser_kwargs))
+        return tasks
+
+    def _record(self, url, stat_url, stats_html, formation_html, game,
+                error, refetched):
+        now = self._clock()
+        pages = (_compress(stats_html), _compress(formation_html))
+        if refetched and stats_html is not None:
+            self.counters['fetched'] += 1
+        if error is not None:
+            self.counters['failed'] += 1
+            self._conn.execute(
+                'UPDATE matches SET state = ?, attempts = attempts + 1,'
+                ' last_error = ?, stat_url = ?, stats_html = ?,'
+                ' formation_html = ?, updated_at = ? WHERE url = ?',
+                (FAILED, error, stat_url) + pages + (now, url)
+            )
+        elif game is None:
+            self._conn.execute(
+                'UPDATE matches SET state = ?, last_error = NULL,'
+                ' stat_url = ?, stats_html = ?, formation_html = ?,'
+                ' updated_at = ? WHERE url = ?',
+                (FETCHED, stat_url) + pages + (now, url)
+            )
+        else:
+            self.counters['parsed'] += 1
+            self._conn.execute(
+                'UPDATE matches SET state = ?, last_error = NULL,'
+                ' stat_url = ?, stats_html = NULL, formation_html = NULL,'
+                ' game = ?, updated_at = ? WHERE url = ?',
+                (PARSED, stat_url, sqlite3.Binary(game), now, url)
+            )
+
+    def _commit(self):
+        self._conn.commit()
+        self.counters['commits'] += 1
+
+    def run(self, max_concurrency=8, fetch_only=False, limit=None):
+        ''' Works through every match that isn't done yet, on
+        `max_concurrency` threads, and returns counts(). With fetch_only the
+        pages are only fetched, so they can be parsed later without the
+        network; limit caps how many matches this run takes on.
+
+        Matches are taken on `batch_size` at a time, and a batch's saved
+        pages are only loaded when it starts, so a resumed run holds no
+        more than one batch of pages in memory.
+        '''
+        todo = self._todo(fetch_only, limit)
+        if not todo:
+            return self.counts()
+
+        pool = ThreadPool(
+            max(1, min(max_concurrency, self.batch_size, len(todo))))
+        uncommitted = False
+        try:
+            for start in range(0, len(todo), self.batch_size):
+                tasks = self._load_tasks(
+                    todo[start:start + self.batch_size], fetch_only)
+                refetch = set(task[0] for task in tasks if task[2] is None)
+                for result in pool.imap_unordered(_run_match, tasks):
+                    self._record(*result, refetched=result[0] in refetch)
+                    uncommitted = True
+                self._commit()
+                uncommitted = False
+        finally:
+            pool.terminate()
+            pool.join()
+            if uncommitted:
+                self._commit()
+        return self.counts()
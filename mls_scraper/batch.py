@@ -0,0 +1,152 @@
+import os
+import sys
+import traceback
+from multiprocessing import Pool, cpu_count
+from multiprocessing.pool import ThreadPool
+
+from archive import encode_game, decode_game
+from parser import MLSStatsParser, SavedPageParser
+
+STATS_SUFFIX = 'stats.html'
+FORMATION_SUFFIX = 'formation.html'
+
+
+def _scrape(args):
+    ''' Worker for scrape_many. Builds a parser for a single url and returns
+    a (url, game, exc_info) tuple so failures can be reported per match,
+    and re-raised with the traceback from the worker thread.
+    '''
+    parser_class, url, parser_kwargs = args
+    try:
+        return url, parser_class(url, **parser_kwargs).game, None
+    except Exception:
+        return url, None, sys.exc_info()
+
+
+def scrape_many(urls, max_concurrency=8, on_error=None,
+                parser_class=MLSStatsParser, **parser_kwargs):
+    ''' Scrapes a batch of stat urls, yielding GameStatSet objects as they
+    complete (which is not necessarily the order they were given in).
+
+    Each match is handled by a parser on one of `max_concurrency` worker
+    threads, so the HTTP round trips for the stats and formation pages of
+    different matches overlap instead of running one after the other.
+
+    If `on_error` is given it is called with (url, exception) for every
+    match that fails, and the batch carries on. Otherwise the first failure
+    is raised. Any other keyword arguments are passed along to the parser.
+    '''
+    urls = list(urls)
+    if not urls:
+        return
+
+    tasks = [(parser_class, url, parser_kwargs) for url in urls]
+    pool = ThreadPool(max(1, min(max_concurrency, len(urls))))
+    try:
+        for url, game, exc_info in pool.imap_unordered(_scrape, tasks):
+            if exc_info is None:
+                yield game
+            elif on_error:
+                on_error(url, exc_info[1])
+            else:
+                raise exc_info[0], exc_info[1], exc_info[2]
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def find_saved_pages(directory):
+    ''' Finds the saved matches under directory, returning a sorted list of
+    (match id, stats path, formation path) tuples.
+
+    A match is a "<name>stats.html" file, with its formation page alongside
+    it as "<name>formation.html" (so test_stats.html and test_formation.html
+    are one match, as are 1234/stats.html and 1234/formation.html). The
+    match id is the name's path relative to directory, minus any trailing
+    separator ("test", "1234"). The formation path is None when there's no
+    formation page.
+    '''
+    matches = []
+    for root, dirs, files in os.walk(directory):
+        for file_name in files:
+            if not file_name.endswith(STATS_SUFFIX):
+                continue
+
+            prefix = file_name[:-len(STATS_SUFFIX)]
+            formation_path = os.path.join(root, prefix + FORMATION_SUFFIX)
+            if not os.path.exists(formation_path):
+                formation_path = None
+            match_id = os.path.relpath(
+                os.path.join(root, prefix), directory).rstrip('_-.')
+            matches.append((
+                match_id, os.path.join(root, file_name), formation_path))
+    return sorted(matches)
+
+
+def _parse_saved(args):
+    ''' Worker for parse_saved. Parses one saved match in a worker process
+    and returns (match id, encoded game, metrics, exception), with the game
+    encoded by encode_game so it's cheap to send back. Tracebacks can't
+    be pickled, so a failure's formatted traceback goes back on the
+    exception's `traceback` attribute instead.
+    '''
+    match_id, stats_path, formation_path, parser_kwargs = args
+    try:
+        stats_parser = SavedPageParser(
+            stats_path, formation_path, **parser_kwargs)
+        return (match_id, encode_game(stats_parser.game),
+                stats_parser.metrics, None)
+    except Exception as exc:
+        exc.traceback = traceback.format_exc()
+        return match_id, None, None, exc
+
+
+def parse_saved(directory, processes=None, chunksize=None, on_error=None,
+                decode=True, **parser_kwargs):
+    ''' Parses every match saved under directory (see find_saved_pages),
+    yielding (match id, game) tuples as they finish, in no particular order.
+
+    Parsing is CPU bound, so rather than threads the matches are spread over
+    a pool of `processes` worker processes (one per CPU by default). Games
+    come back serialized with encode_game, `chunksize` matches at a time, to
+    keep the cost of shipping them between processes down. Pass
+    decode=False to get the encoded strings instead of GameStatSets. Decoded
+    games carry the ParseMetrics from the worker that parsed them.
+
+    Errors are handled as in scrape_many, except that the exceptions come
+    from another process: the worker's traceback is on their `traceback`
+    attribute, formatted. Any other keyword arguments are passed along to
+    the parser, and have to be picklable.
+    '''
+    tasks = [x + (parser_kwargs,) for x in find_saved_pages(directory)]
+    if not tasks:
+        return
+
+    processes = max(1, min(processes or cpu_count(), len(tasks)))
+    if chunksize is None:
+        chunksize = max(1, len(tasks) // (processes * 4))
+
+    pool = Pool(processes)
+    finished = False
+    try:
+        results = pool.imap_unordered(_parse_saved, tasks, chunksize)
+        for match_id, data, metrics, exc in results:
+            if exc is not None:
+                if not on_error:
+                    raise exc
+                on_error(match_id, exc)
+            elif decode:
+                game = decode_game(data)
+                game.metrics = metrics
+                yield match_id, game
+            else:
+                yield match_id, data
+        finished = True
+    finally:
+        if finished:
+            # Let the workers exit on their own, which gives them a chance
+            # to write out their logs
+            pool.close()
+        else:
+            pool.terminate()
+        pool.join()
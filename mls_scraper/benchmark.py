@@ -0,0 +1,209 @@
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+from timeit import default_timer
+
+from parser import MLSStatsParser
+from stubserver import StubServer, load_fixture
+from transport import Transport
+
+_TBODY_RE = re.compile(r'(<tbody>)(.*?)(</tbody>)', re.DOTALL)
+
+# Parsers log to this, so log output isn't timed along with the parsing
+_logger = logging.getLogger(__name__)
+_logger.addHandler(logging.NullHandler())
+_logger.propagate = False
+
+
+def scale_page(html, scale):
+    ''' Makes a bigger stats page by repeating the rows of every table
+    (players, goals, bookings, team stats) `scale` times
+    '''
+    if scale == 1:
+        return html
+    return _TBODY_RE.sub(
+        lambda m: m.group(1) + m.group(2) * scale + m.group(3), html)
+
+
+def _measure(func, repeat, setup=None):
+    ''' Runs func `repeat` times, calling setup (untimed) before each run,
+    and returns the run times in seconds
+    '''
+    runs = []
+    for count in range(repeat):
+        if setup:
+            setup()
+        start = default_timer()
+        func()
+        runs.append(default_timer() - start)
+    return runs
+
+
+def _summarize(runs):
+    ordered = sorted(runs)
+    return {
+        'min': ordered[0],
+        'median': ordered[len(ordered) // 2],
+        'mean': sum(ordered) / len(ordered),
+        'runs': len(ordered),
+    }
+
+
+class _Cases(object):
+    ''' The benchmarked operations for one stats page, each run against a
+    parser that has everything it depends on loaded already
+    '''
+
+    def __init__(self, url, stats_html, formation_html, parser_kwargs):
+        self.url = url
+        self.stats_html = stats_html
+        self.formation_html = formation_html
+        self.parser_kwargs = parser_kwargs
+        self.parser = self._new_parser()
+
+    def _new_parser(self):
+        return MLSStatsParser(
+            self.url, generate_stats=False, **self.parser_kwargs)
+
+    def _loaded(self, *methods):
+        def setup():
+            self.parser = self._new_parser()
+            self.parser._parse_stat_html(self.stats_html)
+            for method in methods:
+                getattr(self.parser, method)()
+        return setup
+
+    def _fresh(self):
+        self.parser = self._new_parser()
+
+    def cases(self):
+        ''' Returns (name, func, setup) for every benchmark '''
+        p = lambda: self.parser
+        return [
+            ('load_stat_html', lambda: p()._load_stat_html(), self._fresh),
+            ('parse_stat_html',
+             lambda: p()._parse_stat_html(self.stats_html), self._fresh),
+            ('get_general_info', lambda: p().get_general_info(),
+             self._loaded()),
+            ('get_team_stats', lambda: p().get_team_stats(), self._loaded()),
+            ('get_players', lambda: p().get_players(), self._loaded()),
+            ('get_events', lambda: p().get_events(),
+             self._loaded('get_general_info', 'get_players')),
+            ('parse_formation_html',
+             lambda: p()._parse_formation_html(self.formation_html),
+             self._loaded('get_players')),
+            ('get_formations', lambda: p().get_formations(),
+             self._loaded('get_players')),
+            ('generate_stats', lambda: p()._generate_stats(), self._fresh),
+        ]
+
+
+def run_benchmarks(scales=(1, 10), repeat=5, **parser_kwargs):
+    ''' Times the parser against the bundled fixtures, served over HTTP
+    from a local StubServer, with the stats page scaled up to each of
+    `scales` times as many rows. Any keyword arguments (backend, partial)
+    are passed along to the parser.
+
+    Returns a dict that can be saved as JSON: "meta" describes the run and
+    "results" maps "scale=N" to the timings of each benchmark.
+    '''
+    stats_html = load_fixture('test_stats.html')
+    formation_html = load_fixture('test_formation.html')
+    own_transport = 'transport' not in parser_kwargs
+    if own_transport:
+        parser_kwargs['transport'] = Transport()
+    parser_kwargs.setdefault('logger', _logger)
+
+    results = {}
+    with StubServer() as server:
+        server.pages['formation'] = formation_html
+        try:
+            for scale in scales:
+                server.pages['stats'] = scaled = scale_page(stats_html, scale)
+                url = server.url('matchcenter/benchmark-%s/stats' % scale)
+                cases = _Cases(url, scaled, formation_html, parser_kwargs)
+                results['scale=%s' % scale] = dict(
+                    (name, _summarize(_measure(func, repeat, setup)))
+                    for name, func, setup in cases.cases())
+        finally:
+            if own_transport:
+                parser_kwargs.pop('transport').close()
+
+    meta = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'repeat': repeat,
+    }
+    for key in ('backend', 'partial'):
+        if key in parser_kwargs:
+            meta[key] = parser_kwargs[key]
+    return {'meta': meta, 'results': results}
+
+
+def compare(baseline, results, threshold=0.1):
+    ''' Compares two runs' median times, returning (scale, benchmark, old,
+    new) for every benchmark that got more than `threshold` slower
+    '''
+    slower = []
+    for scale, timings in sorted(results['results'].items()):
+        old_timings = baseline['results'].get(scale, {})
+        for name, timing in sorted(timings.items()):
+            if name not in old_timings:
+                continue
+            old = old_timings[name]['median']
+            new = timing['median']
+            if new > old * (1 + threshold):
+                slower.append((scale, name, old, new))
+    return slower
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        description='Times the parser against the bundled fixtures. Pass '
+                    'an earlier run saved with --output as --baseline to '
+                    'see what got slower.')
+    arg_parser.add_argument(
+        '--scale', type=int, action='append',
+        help='how many times over to repeat the stats page rows; can be '
+             'given more than once (default: 1 and 10)')
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    arg_parser.add_argument('--backend')
+    arg_parser.add_argument('--partial', action='store_true')
+    arg_parser.add_argument('--output', help='write the results here')
+    arg_parser.add_argument(
+        '--baseline', help='an earlier run to compare the results against')
+    arg_parser.add_argument('--threshold', type=float, default=0.1)
+    args = arg_parser.parse_args(argv)
+
+    parser_kwargs = {'partial': args.partial}
+    if args.backend:
+        parser_kwargs['backend'] = args.backend
+    results = run_benchmarks(
+        args.scale or (1, 10), args.repeat, **parser_kwargs)
+
+    for scale, timings in sorted(results['results'].items()):
+        print scale
+        for name, timing in sorted(timings.items()):
+            print '    %-22s %9.2fms' % (name, timing['median'] * 1000)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            slower = compare(json.load(baseline_file), results, args.threshold)
+        for scale, name, old, new in slower:
+            print 'SLOWER %s %s: %.2fms -> %.2fms' % (
+                scale, name, old * 1000, new * 1000)
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+import re
+import time
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+
+
+MATCH_DATE_RE = re.compile(r'(\d{4}-\d{2}-\d{2})')
+
+
+class CachedResponse(object):
+    ''' Just enough of a requests Response for the parsers, built from a
+    cache entry.
+    '''
+
+    from_cache = True
+
+    def __init__(self, url, content, status_code=200, headers=None):
+        self.url = url
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers if headers else {}
+
+
+class ResponseCache(object):
+    ''' An on-disk cache of fetched pages, stored in a single SQLite file.
+
+    Only responses that came from the url that was asked for are cached.
+    A stats url that MLS redirects to a recap goes to the site every time,
+    so the parser always sees the redirect. Storing the recap under its own
+    url would only fill the cache with a page nobody looks up.
+
+    How long an entry stays fresh depends on the match date in its url.
+    Matches older than `finished_after` are treated as finished and use
+    `finished_ttl` (None meaning forever), anything newer is considered live
+    and uses `live_ttl`. Once an entry goes stale it is revalidated with its
+    ETag/Last-Modified headers when the site sent any, so unchanged pages
+    come back as a cheap 304.
+
+    The cache holds at most `max_size` bytes of content, evicting the least
+    recently used entries first. Hits, misses, revalidations, stores and
+    evictions are counted in `counters`.
+    '''
+
+    def __init__(self, path, max_size=256 * 1024 * 1024, live_ttl=60,
+                 finished_ttl=None, finished_after=timedelta(days=1),
+                 clock=time.time):
+        self.path = path
+        self.max_size = max_size
+        self.live_ttl = live_ttl
+        self.finished_ttl = finished_ttl
+        self.finished_after = finished_after
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'revalidated': 0,
+            'stores': 0,
+            'evictions': 0,
+        }
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            ' url TEXT PRIMARY KEY,'
+            ' content BLOB NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' etag TEXT,'
+            ' last_modified TEXT,'
+            ' expires_at REAL,'
+            ' accessed_at REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS responses_accessed'
+            ' ON responses (accessed_at)'
+        )
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def ttl_for(self, url):
+        ''' Returns how many seconds a page for url stays fresh, or None if
+        it never goes stale.
+        '''
+        match = MATCH_DATE_RE.search(url)
+        if not match:
+            return self.live_ttl
+
+        match_date = datetime.strptime(match.group(1), '%Y-%m-%d').date()
+        today = date.fromtimestamp(self._clock())
+        if today - match_date >= self.finished_after:
+            return self.finished_ttl
+        return self.live_ttl
+
+    def _count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def get(self, url):
+        ''' Returns the (response, fresh) pair cached for url, or None '''
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT content, etag, last_modified, expires_at'
+                ' FROM responses WHERE url = ?', (url,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            self._conn.execute(
+                'UPDATE responses SET accessed_at = ? WHERE url = ?',
+                (self._clock(), url)
+            )
+            self._conn.commit()
+
+        content, etag, last_modified, expires_at = row
+        headers = {}
+        if etag:
+            headers['ETag'] = etag
+        if last_modified:
+            headers['Last-Modified'] = last_modified
+        fresh = expires_at is None or expires_at > self._clock()
+        return CachedResponse(url, str(content), headers=headers), fresh
+
+    def _expires_at(self, url):
+        ttl = self.ttl_for(url)
+        if ttl is None:
+            return None
+        return self._clock() + ttl
+
+    def store(self, resp):
+        ''' Caches a successful response under the url it came from '''
+        now = self._clock()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (url, content, size, etag,'
+                ' last_modified, expires_at, accessed_at)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (resp.url, sqlite3.Binary(resp.content), len(resp.content),
+                 resp.headers.get('ETag'), resp.headers.get('Last-Modified'),
+                 self._expires_at(resp.url), now)
+            )
+            self._count('stores')
+            self._evict()
+            self._conn.commit()
+
+    def touch(self, url):
+        ''' Marks the entry for url as fresh again after a 304 '''
+        with self._lock:
+            self._conn.execute(
+                'UPDATE responses SET expires_at = ? WHERE url = ?',
+                (self._expires_at(url), url)
+            )
+            self._conn.commit()
+
+    def _evict(self):
+        total, = self._conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()
+        if total <= self.max_size:
+            return
+
+        rows = self._conn.execute(
+            'SELECT url, size FROM responses ORDER BY accessed_at ASC'
+        ).fetchall()
+        for url, size in rows:
+            if total <= self.max_size:
+                break
+            self._conn.execute('DELETE FROM responses WHERE url = ?', (url,))
+            self._count('evictions')
+            total -= size
+
+    def fetch(self, url, transport):
+        ''' Returns the page at url, from the cache when it's fresh, and
+        through transport otherwise.
+        '''
+        cached = self.get(url)
+        if cached is None:
+            self._count('misses')
+            resp = transport.get(url)
+        else:
+            cached_resp, fresh = cached
+            if fresh:
+                self._count('hits')
+                return cached_resp
+
+            conditional = {}
+            if 'ETag' in cached_resp.headers:
+                conditional['If-None-Match'] = cached_resp.headers['ETag']
+            if 'Last-Modified' in cached_resp.headers:
+                conditional['If-Modified-Since'] = \
+                    cached_resp.headers['Last-Modified']
+            if not conditional:
+                self._count('misses')
+                resp = transport.get(url)
+            else:
+                resp = transport.get(url, headers=conditional)
+                if resp.status_code == 304:
+                    self._count('revalidated')
+                    self.touch(url)
+                    return cached_resp
+                self._count('misses')
+
+        if resp.status_code == 200 and resp.url == url:
+            self.store(resp)
+        return resp
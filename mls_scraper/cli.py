@@ -0,0 +1,279 @@
+import sys
+import json
+import argparse
+from datetime import datetime
+from timeit import default_timer
+
+import backends
+from archive import MatchArchive
+from batch import scrape_many
+from cache import ResponseCache
+from discovery import MatchCrawler, MatchFrontier, candidate_urls, match_key
+from metrics import ParseMetrics
+from parser import StatsParser
+from player import Keeper
+from stats import TEAM_STATS
+from transport import Transport
+
+# The stages that make up a match's latency, see StatsParser.iter_stats
+LATENCY_STAGES = ('load_stats',) + tuple(
+    stage for stage, method in StatsParser.STAGES)
+
+
+def _player_dict(player_obj):
+    fields = dict(
+        (name, getattr(player_obj, name))
+        for klass in type(player_obj).__mro__
+        for name in getattr(klass, '__slots__', ()))
+    fields['name'] = player_obj.name
+    fields['keeper'] = isinstance(player_obj, Keeper)
+    return fields
+
+
+def _name(player_obj):
+    return player_obj.name if player_obj else None
+
+
+def _team_dict(team):
+    stats = dict((attr, getattr(team.stats, attr))
+                 for title, attr, convert in TEAM_STATS)
+    stats['other'] = team.stats.other
+    formation = None
+    if team.formation is not None:
+        formation = {
+            'formation': team.formation.formation,
+            'lines': [[x.name for x in line]
+                      for line in team.formation.players],
+        }
+    return {
+        'name': team.name,
+        'stats': stats,
+        'starters': [_player_dict(x) for x in team.starters],
+        'keepers': [_player_dict(x) for x in team.keepers],
+        'subs': [_player_dict(x) for x in team.subs],
+        'formation': formation,
+    }
+
+
+def game_to_dict(game):
+    ''' Turns a GameStatSet into plain dicts and lists, ready for JSON.
+    Events refer to players and teams by name.
+    '''
+    return {
+        'stat_url': game.stat_url,
+        'game_date': game.game_date.isoformat() if game.game_date else None,
+        'home_team': _team_dict(game.home_team),
+        'away_team': _team_dict(game.away_team),
+        'goals': [{
+            'time': x.time, 'team': x.team.name, 'player': _name(x.player),
+            'own_goal': x.own_goal,
+            'assisted_by': [y.name for y in x.assisted_by],
+        } for x in game.goals],
+        'bookings': [{
+            'time': x.time, 'team': x.team.name, 'player': _name(x.player),
+            'card_color': x.card_color, 'reason': x.reason,
+        } for x in game.disciplinary_events],
+        'subs': [{
+            'time': x.time, 'team': x.team.name,
+            'player_on': _name(x.player_on),
+            'player_off': _name(x.player_off),
+        } for x in game.subs],
+    }
+
+
+def _percentile(ordered, percent):
+    ''' Nearest-rank percentile of an already sorted list '''
+    index = max(0, int(round(percent / 100.0 * len(ordered))) - 1)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def summarize(latencies, failures, elapsed, metrics):
+    ''' Formats the end-of-run summary: how many matches were scraped,
+    throughput, and the spread of per-match latencies
+    '''
+    lines = ['%s matches scraped, %s failed in %.1fs (%.2f matches/s)' % (
+        len(latencies), failures, elapsed,
+        len(latencies) / elapsed if elapsed else 0)]
+    if latencies:
+        ordered = sorted(latencies)
+        lines.append(
+            'latency: p50 %.0fms, p90 %.0fms, p99 %.0fms, max %.0fms' % tuple(
+                x * 1000 for x in (
+                    _percentile(ordered, 50), _percentile(ordered, 90),
+                    _percentile(ordered, 99), ordered[-1])))
+    downloaded = metrics.counters.get('bytes_downloaded', 0)
+    lines.append('%.1f MB downloaded, %s pages from the cache' % (
+        downloaded / 1e6, metrics.counters.get('cache_hits', 0)))
+    return '\n'.join(lines)
+
+
+def _date(text):
+    return datetime.strptime(text, '%Y-%m-%d').date()
+
+
+def _build_arg_parser():
+    arg_parser = argparse.ArgumentParser(
+        prog='mls-scraper',
+        description='Scrapes MLS match stats pages and writes out the '
+                    'matches as JSON, one per line.')
+    arg_parser.add_argument('urls', nargs='*', help='match stats urls')
+    arg_parser.add_argument(
+        '-f', '--url-file', action='append', default=[],
+        help='read urls from this file, one per line ("-" for stdin)')
+    arg_parser.add_argument(
+        '--start', type=_date,
+        help='only matches on or after this date (YYYY-MM-DD)')
+    arg_parser.add_argument(
+        '--end', type=_date, help='only matches before this date')
+    arg_parser.add_argument(
+        '--crawl', action='append', default=[], metavar='URL',
+        help='find match urls on this page (a schedule, say)')
+    arg_parser.add_argument(
+        '--follow', metavar='PATTERN',
+        help='also crawl pages linked from crawled pages whose url matches')
+    arg_parser.add_argument(
+        '--club', action='append', default=[],
+        help='with --start and --end, try every pairing of these clubs on '
+             'every day in between (all clubs if there are no other urls)')
+    arg_parser.add_argument(
+        '-w', '--workers', type=int, default=8,
+        help='how many matches to scrape at once (default: 8)')
+    arg_parser.add_argument(
+        '--backend', choices=sorted(backends.BACKENDS),
+        help='html parser (default: beautifulsoup)')
+    arg_parser.add_argument('--partial', action='store_true')
+    arg_parser.add_argument(
+        '--cache', metavar='PATH', help='cache pages in this file')
+    arg_parser.add_argument(
+        '--min-interval', type=float, default=0,
+        help='seconds between requests to the site')
+    arg_parser.add_argument(
+        '-o', '--output', default='-',
+        help='write NDJSON here (default: stdout, "" for none)')
+    arg_parser.add_argument(
+        '--archive', metavar='PATH', help='also append matches to an archive')
+    arg_parser.add_argument(
+        '--store', metavar='PATH',
+        help='also save the matches as a SeasonStore .npz file')
+    return arg_parser
+
+
+def _read_urls(paths, stdin):
+    for path in paths:
+        url_file = stdin if path == '-' else open(path)
+        try:
+            for line in url_file:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    yield line
+        finally:
+            if url_file is not stdin:
+                url_file.close()
+
+
+def _in_range(url, start, end):
+    key = match_key(url)
+    if key is None:
+        return not (start or end)
+    return (not start or key[0] >= start) and (not end or key[0] < end)
+
+
+def find_urls(args, transport, stdin=sys.stdin):
+    ''' Gathers the urls to scrape from the command line, url files,
+    crawled pages and generated pairings, each match only once. Given
+    only --start and --end, every pairing of every club is tried.
+    '''
+    frontier = MatchFrontier()
+    urls = []
+    for url in list(args.urls) + list(_read_urls(args.url_file, stdin)):
+        if not _in_range(url, args.start, args.end):
+            continue
+        # Urls that don't look like match center urls are passed through
+        if match_key(url) is None:
+            urls.append(url)
+        else:
+            frontier.add(url)
+
+    if args.crawl:
+        MatchCrawler(args.start, args.end, frontier, args.follow,
+                     transport=transport).crawl(args.crawl)
+    # A date range on its own means every pairing of every club
+    date_range_only = not (
+        args.urls or args.url_file or args.crawl or args.club)
+    if args.club or date_range_only:
+        if not (args.start and args.end):
+            raise ValueError(
+                '--club needs --start and --end' if args.club else
+                'give urls, --url-file, --crawl, or --start and --end')
+        for url in candidate_urls(args.start, args.end, args.club or None):
+            frontier.add(url, confirmed=False)
+    return urls + list(frontier)
+
+
+def main(argv=None, stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr):
+    args = _build_arg_parser().parse_args(argv)
+    # Every worker's parser can have a formation page fetching in the
+    # background as well as its stats page, so allow two connections each
+    transport = Transport(min_interval=args.min_interval,
+                          pool_size=2 * args.workers)
+    try:
+        urls = find_urls(args, transport, stdin)
+    except ValueError as exc:
+        transport.close()
+        stderr.write('%s\n' % exc)
+        return 2
+
+    parser_kwargs = {'transport': transport, 'partial': args.partial}
+    if args.backend:
+        parser_kwargs['backend'] = args.backend
+    if args.cache:
+        parser_kwargs['cache'] = ResponseCache(args.cache)
+
+    output = None
+    if args.output == '-':
+        output = stdout
+    elif args.output:
+        output = open(args.output, 'w')
+    archive = MatchArchive(args.archive) if args.archive else None
+    store = None
+    if args.store:
+        from season import SeasonStore
+        store = SeasonStore()
+
+    failures = []
+
+    def on_error(url, exc):
+        failures.append(url)
+        stderr.write('Failed to scrape %s: %s\n' % (url, exc))
+
+    latencies = []
+    metrics = ParseMetrics()
+    start = default_timer()
+    try:
+        for game in scrape_many(urls, args.workers, on_error,
+                                **parser_kwargs):
+            latencies.append(sum(game.metrics.timings.get(x, 0)
+                                 for x in LATENCY_STAGES))
+            metrics.merge(game.metrics)
+            if output is not None:
+                output.write(json.dumps(game_to_dict(game)) + '\n')
+            if archive is not None:
+                archive.append(game)
+            if store is not None:
+                store.add_game(game)
+    finally:
+        if output is not None and output is not stdout:
+            output.close()
+        if archive is not None:
+            archive.close()
+        if store is not None:
+            store.save(args.store)
+        transport.close()
+
+    stderr.write(summarize(
+        latencies, len(failures), default_timer() - start, metrics) + '\n')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,5 @@
+import functools
+
 ABBREVIATION_MAP = {
     'CHI': 'Chicago Fire',
     'CHV': 'Chivas USA',
@@ -22,3 +24,31 @@ ABBREVIATION_MAP = {
     'TOR': 'Toronto FC',
     'VAN': 'Vancouver Whitecaps FC',
 }
+
+
+def memoize(maxsize=4096):
+    ''' Decorator memoizing a function of one hashable argument. Once
+    `maxsize` results are held the memo starts over, so it stays bounded
+    however many different arguments come through. The wrapper's `clear()`
+    empties it.
+    '''
+    def decorate(func):
+        memo = {}
+
+        @functools.wraps(func)
+        def wrapper(arg):
+            try:
+                return memo[arg]
+            except KeyError:
+                pass
+            result = func(arg)
+            if len(memo) >= maxsize:
+                memo.clear()
+            # setdefault, so threads racing on the same argument all get
+            # the one result back
+            return memo.setdefault(arg, result)
+
+        wrapper.memo = memo
+        wrapper.clear = memo.clear
+        return wrapper
+    return decorate
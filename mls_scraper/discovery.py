@@ -0,0 +1,244 @@
+import re
+import heapq
+import logging
+import itertools
+from datetime import datetime, timedelta
+from urlparse import urljoin
+
+import requests
+
+from log import LOGGER_NAME
+from transport import get_default_transport
+from mls_scraper.common import ABBREVIATION_MAP
+
+BASE_URL = 'http://www.mlssoccer.com'
+
+# Match center links, whichever of the match's pages (stats, recap,
+# boxscore...) they point at
+MATCH_URL_RE = re.compile(
+    r'/matchcenter/(\d{4}-\d{2}-\d{2})-([A-Z]+)-v-([A-Z]+)(?:/[\w-]*)?')
+HREF_RE = re.compile(r'''href\s*=\s*["']([^"']+)["']''', re.IGNORECASE)
+
+# The code used in generated urls for clubs that go by more than one. Links
+# found on the site are used as they are.
+PREFERRED_CODES = {
+    'Montreal Impact': 'MTL',
+    'Portland Timbers': 'POR',
+    'Sporting Kansas City': 'SKC',
+}
+
+
+def club_code(club):
+    ''' Returns the code to use in urls for a club, given its name or any of
+    its codes
+    '''
+    name = ABBREVIATION_MAP.get(club, club)
+    if name in PREFERRED_CODES:
+        return PREFERRED_CODES[name]
+    for code, club_name in ABBREVIATION_MAP.items():
+        if club_name == name:
+            return code
+    raise ValueError('Unknown club: %s' % club)
+
+
+def parse_match_url(url):
+    ''' Splits a match center url into (date, home code, away code), or
+    returns None if it isn't one
+    '''
+    match = MATCH_URL_RE.search(url)
+    if match is None:
+        return None
+    match_date = datetime.strptime(match.group(1), '%Y-%m-%d').date()
+    return match_date, match.group(2), match.group(3)
+
+
+def match_key(url):
+    ''' Identifies the match behind a match center url, so that urls using
+    different codes for the same club (MON and MTL, KC and SKC) and pointing
+    at different pages of the match all come out the same. Returns None for
+    anything else, and for clubs we don't know.
+    '''
+    parsed = parse_match_url(url)
+    if parsed is None:
+        return None
+    match_date, home, away = parsed
+    if home not in ABBREVIATION_MAP or away not in ABBREVIATION_MAP:
+        return None
+    return match_date, ABBREVIATION_MAP[home], ABBREVIATION_MAP[away]
+
+
+def stats_url(url):
+    ''' Points a match center url at the match's stats page '''
+    match = MATCH_URL_RE.search(url)
+    return '%s/matchcenter/%s-%s-v-%s/stats' % (
+        url[:match.start()], match.group(1), match.group(2), match.group(3))
+
+
+def candidate_urls(start, end, clubs=None, base_url=BASE_URL):
+    ''' Generates a stats url for every pairing of `clubs` (every club we
+    know of by default) on every day in [start, end). Each club gets a
+    single code, so no match is generated twice.
+    '''
+    if clubs is None:
+        clubs = set(ABBREVIATION_MAP.values())
+    codes = sorted(set(club_code(x) for x in clubs))
+    day = start
+    while day < end:
+        for home, away in itertools.permutations(codes, 2):
+            yield '%s/matchcenter/%s-%s-v-%s/stats' % (
+                base_url, day.isoformat(), home, away)
+        day += timedelta(days=1)
+
+
+class MatchFrontier(object):
+    ''' The stats urls waiting to be scraped, each match queued only once.
+
+    Urls are de-duplicated by match_key, so aliases for the same club, and
+    links to a match's recap or boxscore rather than its stats, don't queue
+    the match again, and neither does a match that's already been popped.
+
+    Matches found linked on the site are handed out before generated
+    guesses (added with confirmed=False); a guess is replaced if a link to
+    the same match turns up before it's popped. Within those, matches come
+    out oldest first, or newest first with `newest_first`.
+    '''
+
+    def __init__(self, newest_first=False):
+        self.newest_first = newest_first
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+
+    def _priority(self, key, confirmed):
+        ordinal = key[0].toordinal()
+        return (0 if confirmed else 1,
+                -ordinal if self.newest_first else ordinal)
+
+    def add(self, url, confirmed=True):
+        ''' Queues the match behind url. Returns False if it was already
+        queued (or popped) or url isn't a match center url.
+        '''
+        key = match_key(url)
+        if key is None:
+            return False
+
+        priority = self._priority(key, confirmed)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[-1] is None or entry[0] <= priority:
+                return False
+            # Upgrade a queued guess; the old heap entry is skipped later
+            entry[-1] = None
+
+        entry = [priority, next(self._counter), stats_url(url), key]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        return True
+
+    def __contains__(self, url):
+        return match_key(url) in self._entries
+
+    def __len__(self):
+        return sum(1 for x in self._heap if x[-1] is not None)
+
+    def pop(self):
+        ''' Returns the next url to scrape. Raises IndexError when there's
+        nothing left.
+        '''
+        while self._heap:
+            priority, count, url, key = heapq.heappop(self._heap)
+            if key is not None:
+                # Keep the match's entry around, marked done, so it's never
+                # queued again
+                self._entries[key][-1] = None
+                return url
+        raise IndexError('pop from an empty frontier')
+
+    def __iter__(self):
+        ''' Pops urls until the frontier is empty. More can be added while
+        iterating.
+        '''
+        while True:
+            try:
+                yield self.pop()
+            except IndexError:
+                return
+
+
+class MatchCrawler(object):
+    ''' Finds match center links on pages of the site (schedules, results,
+    club pages) and queues the matches between `start` and `end` on a
+    MatchFrontier.
+
+    Links on the crawled pages that match the `follow` pattern are crawled
+    too (each page once, and at most `max_pages` in all), which is how to
+    get through paginated schedules. Pages are scanned for links with a
+    regular expression rather than parsed.
+    '''
+
+    def __init__(self, start=None, end=None, frontier=None, follow=None,
+                 max_pages=100, transport=None, logger=None):
+        self.start = start
+        self.end = end
+        if frontier is None:
+            frontier = MatchFrontier()
+        self.frontier = frontier
+        self.follow = re.compile(follow) if follow else None
+        self.max_pages = max_pages
+        self.transport = transport if transport else get_default_transport()
+        self.logger = logger if logger else logging.getLogger(
+            '%s.discovery' % LOGGER_NAME)
+        self.counters = {
+            'pages': 0,
+            'links': 0,
+            'queued': 0,
+        }
+        self._crawled = set()
+
+    def _in_range(self, key):
+        match_date = key[0]
+        if self.start and match_date < _as_date(self.start):
+            return False
+        if self.end and match_date >= _as_date(self.end):
+            return False
+        return True
+
+    def crawl(self, seed_urls):
+        ''' Crawls the seed pages (and anything they lead to, see follow)
+        and returns the frontier. Pages that can't be fetched are logged
+        and skipped.
+        '''
+        pending = list(seed_urls)
+        while pending and self.counters['pages'] < self.max_pages:
+            page_url = pending.pop(0)
+            if page_url in self._crawled:
+                continue
+            self._crawled.add(page_url)
+
+            self.counters['pages'] += 1
+            try:
+                resp = self.transport.get(page_url)
+            except requests.RequestException:
+                self.logger.exception('Unable to crawl %s', page_url)
+                continue
+            if not resp.status_code == 200:
+                self.logger.error(
+                    'Improper status code for %s: %s', page_url,
+                    resp.status_code)
+                continue
+
+            for href in HREF_RE.findall(resp.content):
+                url = urljoin(page_url, href)
+                key = match_key(url)
+                if key is not None:
+                    self.counters['links'] += 1
+                    if self._in_range(key) and self.frontier.add(url):
+                        self.counters['queued'] += 1
+                elif self.follow and self.follow.search(url) and \
+                        url not in self._crawled:
+                    pending.append(url)
+        return self.frontier
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
@@ -1,26 +1,39 @@
-
-
 class BaseEvent(object):
 
-    time = 0
-    team = None
+    __slots__ = ('time', 'team')
+
+    def __init__(self):
+        self.time = 0
+        self.team = None
 
 
 class Goal(BaseEvent):
 
-    player = None
-    assisted_by = []
-    own_goal = False
+    __slots__ = ('player', 'assisted_by', 'own_goal')
+
+    def __init__(self):
+        super(Goal, self).__init__()
+        self.player = None
+        self.assisted_by = []
+        self.own_goal = False
 
 
 class Booking(BaseEvent):
 
-    player = None
-    card_color = None
-    reason = None
+    __slots__ = ('player', 'card_color', 'reason')
+
+    def __init__(self):
+        super(Booking, self).__init__()
+        self.player = None
+        self.card_color = None
+        self.reason = None
 
 
 class Substitution(BaseEvent):
 
-    player_on = None
-    player_off = None
+    __slots__ = ('player_on', 'player_off')
+
+    def __init__(self):
+        super(Substitution, self).__init__()
+        self.player_on = None
+        self.player_off = None
@@ -3,16 +3,55 @@ from team import Team
 
 class GameStatSet(object):
 
-    home_team = None
-    away_team = None
-    stat_url = None
-    goals = []
-    disciplinary_events = []
-    game_date = None
-    subs = []
+    __slots__ = (
+        'home_team', 'away_team', 'stat_url', 'goals',
+        'disciplinary_events', 'game_date', 'subs', 'stat_html', 'metrics',
+    )
 
     def __init__(self, stat_url=None, home_team=None, away_team=None):
         self.stat_url = stat_url
         self.stat_html = None
+        self.metrics = None
         self.home_team = home_team if home_team else Team()
         self.away_team = away_team if away_team else Team()
+        self.goals = []
+        self.disciplinary_events = []
+        self.game_date = None
+        self.subs = []
+
+
+def _lazy_attribute(attr):
+    ''' A property wrapping one of GameStatSet's slots that gives the game's
+    loader a chance to fill it in before it's read
+    '''
+    slot = getattr(GameStatSet, attr)
+
+    def get_value(self):
+        self._loader(attr)
+        return slot.__get__(self, GameStatSet)
+
+    def set_value(self, value):
+        slot.__set__(self, value)
+
+    return property(get_value, set_value)
+
+
+class LazyGameStatSet(GameStatSet):
+    ''' A GameStatSet whose stats are worked out on first access. Reading
+    one of the lazy attributes calls loader with the attribute's name first,
+    which is expected to fill it in (or do nothing if it already has).
+    '''
+
+    __slots__ = ('_loader',)
+
+    home_team = _lazy_attribute('home_team')
+    away_team = _lazy_attribute('away_team')
+    game_date = _lazy_attribute('game_date')
+    goals = _lazy_attribute('goals')
+    disciplinary_events = _lazy_attribute('disciplinary_events')
+    subs = _lazy_attribute('subs')
+
+    def __init__(self, loader, stat_url=None, home_team=None,
+                 away_team=None):
+        self._loader = loader
+        super(LazyGameStatSet, self).__init__(stat_url, home_team, away_team)
@@ -0,0 +1,234 @@
+import time
+import hashlib
+
+import requests
+
+from parser import MLSStatsParser
+from stats import TEAM_STATS
+
+
+class StatChange(object):
+    ''' A team stat that changed between two polls. `old` is None the first
+    time a stat shows up.
+    '''
+
+    __slots__ = ('team', 'stat', 'old', 'new')
+
+    def __init__(self, team, stat, old, new):
+        self.team = team
+        self.stat = stat
+        self.old = old
+        self.new = new
+
+
+def _goal_key(goal):
+    return ('goal', goal.time, goal.team.name,
+            goal.player.name if goal.player else None, goal.own_goal)
+
+
+def _booking_key(booking):
+    return ('booking', booking.time, booking.team.name, booking.player.name,
+            booking.card_color)
+
+
+def _sub_key(sub):
+    return ('sub', sub.time, sub.team.name,
+            sub.player_on.name if sub.player_on else None,
+            sub.player_off.name if sub.player_off else None)
+
+
+class LiveTracker(object):
+    ''' Follows a match while it's being played, polling its stats page and
+    handing anything new to `callback`: Goal, Booking and Substitution
+    events as they appear, and a StatChange for every team stat that moves.
+
+    Polls are conditional requests, so a page that hasn't changed since the
+    last poll comes back as a 304 and costs nothing to process. When it has
+    changed, the page is parsed again (only the regions the tracker reads,
+    unless partial is turned off), each section is fingerprinted, and only
+    the sections whose fingerprint moved go through the getters again. So
+    the fingerprints save the work of re-reading unchanged sections, not
+    the parsing itself. The game as of the last poll is kept on `game`.
+
+    Any extra keyword arguments are passed along to MLSStatsParser, which
+    is built for partial parsing unless told otherwise.
+    '''
+
+    # The sections of the stats page the tracker watches, and the indexed
+    # elements (see parser.INDEXED_IDS and INDEXED_CLASSES) each one is read
+    # from
+    SECTIONS = (
+        ('info', ('home-team-title', 'away-team-title', 'game-data-date',
+                  'game-data-timezone')),
+        ('players', ('stats-starters', 'stats-goalkeeper', 'stats-subs')),
+        ('team_stats', ('stats-game',)),
+        ('subs', ('stats-subs',)),
+        ('goals', ('goals',)),
+        ('bookings', ('disciplinary',)),
+    )
+
+    def __init__(self, stat_url, callback, interval=60, sleep=time.sleep,
+                 **parser_kwargs):
+        parser_kwargs.setdefault('partial', True)
+        self.parser = MLSStatsParser(
+            stat_url, generate_stats=False, **parser_kwargs)
+        self.callback = callback
+        self.interval = interval
+        self.counters = {
+            'polls': 0,
+            'unchanged': 0,
+            'sections_parsed': 0,
+        }
+        self._sleep = sleep
+        self._etag = None
+        self._fingerprints = {}
+        self._seen = set()
+
+    @property
+    def game(self):
+        return self.parser.game
+
+    @property
+    def logger(self):
+        return self.parser.logger
+
+    def _fetch(self):
+        ''' Fetches the stats page, returning None if it hasn't changed
+        since the last poll
+        '''
+        headers = {'If-None-Match': self._etag} if self._etag else None
+        resp = self.parser._fetch_stat_response(headers)
+        # With a response cache the parser doesn't pass our headers on, and
+        # an unchanged page comes back from the cache as it was last time
+        etag = resp.headers.get('ETag')
+        if resp.status_code == 304 or (etag and etag == self._etag):
+            return None
+
+        self._etag = etag
+        return resp
+
+    def _fingerprint(self, keys):
+        digest = hashlib.md5()
+        index = self.parser._stat_index
+        for key in keys:
+            for side, tag in sorted(index.get(key, {}).items()):
+                digest.update(str(tag))
+        return digest.digest()
+
+    def _changed_sections(self):
+        changed = set()
+        for section, keys in self.SECTIONS:
+            fingerprint = self._fingerprint(keys)
+            if fingerprint != self._fingerprints.get(section):
+                self._fingerprints[section] = fingerprint
+                changed.add(section)
+
+        # Events point at the players, and goals and bookings are matched
+        # to teams by name, so they're worked out again along with those
+        if changed & set(('info', 'players')):
+            changed.update(('subs', 'goals', 'bookings'))
+        self.counters['sections_parsed'] += len(changed)
+        return changed
+
+    def _new_events(self, found, key_func, seen):
+        events = []
+        for event in found:
+            key = key_func(event)
+            if key not in seen:
+                seen.add(key)
+                events.append(event)
+        return events
+
+    def _stat_changes(self, old_stats):
+        changes = []
+        teams = (self.game.home_team, self.game.away_team)
+        for team, old in zip(teams, old_stats):
+            for title, attr, convert in TEAM_STATS:
+                old_value = getattr(old, attr)
+                new_value = getattr(team.stats, attr)
+                if new_value != old_value:
+                    changes.append(
+                        StatChange(team, attr, old_value, new_value))
+        return changes
+
+    def _poll(self):
+        ''' Fetches the stats page and works out what's new on it, without
+        telling the callback
+        '''
+        self.counters['polls'] += 1
+        resp = self._fetch()
+        if resp is None:
+            self.counters['unchanged'] += 1
+            return []
+
+        try:
+            return self._read(resp.content)
+        except Exception:
+            # Sections after the one that failed were fingerprinted but
+            # never read, so start over with the whole page next time
+            self._etag = None
+            self._fingerprints.clear()
+            raise
+
+    def _read(self, html):
+        parser = self.parser
+        game = self.game
+        parser._parse_stat_html(html)
+        # Events only count as seen once the whole page has been read
+        seen = set(self._seen)
+        changed = self._changed_sections()
+
+        events = []
+        if 'info' in changed:
+            parser.get_general_info()
+        if 'players' in changed:
+            parser.get_players()
+        if 'team_stats' in changed:
+            old_stats = (game.home_team.stats, game.away_team.stats)
+            parser.get_team_stats()
+            events.extend(self._stat_changes(old_stats))
+        if 'subs' in changed:
+            parser._get_substitution_events()
+            events.extend(self._new_events(game.subs, _sub_key, seen))
+        if 'goals' in changed:
+            parser._get_goals()
+            events.extend(self._new_events(game.goals, _goal_key, seen))
+        if 'bookings' in changed:
+            parser._get_bookings()
+            events.extend(self._new_events(
+                game.disciplinary_events, _booking_key, seen))
+        self._seen = seen
+        return events
+
+    def poll(self):
+        ''' Polls the stats page once, handing everything new to the
+        callback. Returns the events that were reported.
+        '''
+        events = self._poll()
+        for event in events:
+            self.callback(event)
+        return events
+
+    def run(self, polls=None):
+        ''' Polls every `interval` seconds, `polls` times or until
+        interrupted. Polls that fail, whether the page couldn't be fetched
+        or couldn't be parsed (say it's a pre-match page missing sections),
+        are logged and retried next time round. Errors from the callback
+        are not caught.
+        '''
+        count = 0
+        while polls is None or count < polls:
+            if count:
+                self._sleep(self.interval)
+            try:
+                events = self._poll()
+            except requests.RequestException:
+                self.logger.exception(
+                    'Unable to poll %s', self.parser.stat_url)
+            except Exception:
+                self.logger.exception(
+                    'Unable to parse %s', self.parser.stat_url)
+            else:
+                for event in events:
+                    self.callback(event)
+            count += 1
@@ -0,0 +1,157 @@
+import os
+import time
+import Queue
+import atexit
+import logging
+import threading
+from multiprocessing import util
+
+LOGGER_NAME = 'mls_scraper'
+
+
+class QueueHandler(logging.Handler):
+    ''' Hands records to a queue instead of writing them out, so logging
+    never waits on a file. A QueueListener does the writing on its own
+    thread.
+    '''
+
+    def __init__(self, queue):
+        logging.Handler.__init__(self)
+        self.queue = queue
+
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except Exception:
+            self.handleError(record)
+
+
+class QueueListener(object):
+    ''' Takes records off a queue on a background thread and passes them to
+    `handlers`. Records are only formatted once they get here, so none of
+    that work happens on the thread doing the logging either.
+    '''
+
+    _stop = object()
+
+    def __init__(self, queue, *handlers):
+        self.queue = queue
+        self.handlers = handlers
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            if record is self._stop:
+                return
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+    def stop(self):
+        ''' Writes out whatever is still queued and stops the thread '''
+        if self._thread is not None:
+            self.queue.put(self._stop)
+            self._thread.join()
+            self._thread = None
+            for handler in self.handlers:
+                handler.flush()
+
+
+class RepeatFilter(logging.Filter):
+    ''' Lets through at most `limit` records with the same message (before
+    formatting) every `interval` seconds and drops the rest. The first
+    record let through after some were dropped says how many.
+
+    Only records below `level` are limited. Warnings and errors, such as a
+    page that couldn't be fetched, always get through.
+    '''
+
+    def __init__(self, limit=10, interval=60, clock=time.time,
+                 level=logging.WARNING):
+        logging.Filter.__init__(self)
+        self.limit = limit
+        self.interval = interval
+        self.level = level
+        self._clock = clock
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= self.level:
+            return True
+
+        key = (record.name, record.msg)
+        now = self._clock()
+        with self._lock:
+            start, passed, dropped = self._windows.get(key, (now, 0, 0))
+            if now - start >= self.interval:
+                start, passed = now, 0
+            if passed >= self.limit:
+                self._windows[key] = (start, passed, dropped + 1)
+                return False
+            self._windows[key] = (start, passed + 1, 0)
+
+        if dropped:
+            record.msg = '%s (%s more like this dropped)' % (
+                record.msg, dropped)
+        return True
+
+
+_default_logger = None
+_default_logger_lock = threading.Lock()
+# What the default logger was set up with, and in which process
+_default_settings = None
+_default_handler = None
+_default_pid = None
+
+
+def _start_default_logging(logger, level, filename):
+    file_handler = logging.FileHandler(filename)
+    file_handler.setFormatter(logging.Formatter(
+        '%(levelname)s:%(name)s:%(message)s'))
+    queue = Queue.Queue()
+    listener = QueueListener(queue, file_handler)
+    listener.start()
+    atexit.register(listener.stop)
+    # multiprocessing workers leave through os._exit, which skips atexit
+    util.Finalize(None, listener.stop, exitpriority=0)
+
+    handler = QueueHandler(queue)
+    handler.addFilter(RepeatFilter())
+    logger.setLevel(level)
+    logger.addHandler(handler)
+    return handler
+
+
+def get_default_logger(level=logging.DEBUG, filename='scraper.log'):
+    ''' Returns the logger used by every parser that wasn't handed one,
+    setting it up on first use.
+
+    It writes to `filename` from a background thread, through a queue, so
+    parsers never block on the log file, and repeats of the same message
+    are capped by a RepeatFilter. Like logging.basicConfig, the level and
+    filename only count the first time.
+
+    A forked process (a parse_saved worker, say) inherits the queue but not
+    the thread emptying it, so the first call in a new process sets up a
+    queue and thread of its own, writing to the same file.
+    '''
+    global _default_logger, _default_settings, _default_handler, _default_pid
+    with _default_logger_lock:
+        if _default_logger is None or _default_pid != os.getpid():
+            logger = logging.getLogger(LOGGER_NAME)
+            if _default_handler is not None:
+                logger.removeHandler(_default_handler)
+            if _default_settings is None:
+                _default_settings = (level, filename)
+            _default_handler = _start_default_logging(
+                logger, *_default_settings)
+            _default_pid = os.getpid()
+            _default_logger = logger
+        return _default_logger
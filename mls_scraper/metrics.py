@@ -0,0 +1,81 @@
+import time
+import threading
+from contextlib import contextmanager
+
+
+class ParseMetrics(object):
+    ''' Where the time went while parsing a match: wall time and call count
+    per stage in `timings` and `calls`, and running totals (bytes
+    downloaded, rows parsed and so on) in `counters`.
+
+    Stages nest, so a stage's time includes the time of any stage run inside
+    it (the formations stage includes fetching the formation page, for
+    instance). Metrics from several matches can be added together with
+    merge(), and written out for Prometheus with to_prometheus(). Safe to
+    update from several threads.
+    '''
+
+    def __init__(self, clock=time.time):
+        self.timings = {}
+        self.calls = {}
+        self.counters = {}
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Only the numbers are pickled, so metrics can be sent back from
+        # worker processes
+        return self.timings, self.calls, self.counters
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.timings, self.calls, self.counters = state
+
+    @contextmanager
+    def time(self, stage):
+        ''' Times the body of a with block as a run of stage '''
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self.add_time(stage, self._clock() - start)
+
+    def add_time(self, stage, seconds, calls=1):
+        with self._lock:
+            self.timings[stage] = self.timings.get(stage, 0) + seconds
+            self.calls[stage] = self.calls.get(stage, 0) + calls
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def merge(self, other):
+        ''' Adds other's timings and counters into these ones, and returns
+        self so a batch can be summed up in one go:
+
+            total = reduce(ParseMetrics.merge, metrics, ParseMetrics())
+        '''
+        for stage, seconds in other.timings.items():
+            self.add_time(stage, seconds, other.calls.get(stage, 0))
+        for name, amount in other.counters.items():
+            self.count(name, amount)
+        return self
+
+    def to_prometheus(self, prefix='mls_scraper'):
+        ''' Renders the metrics in the Prometheus text exposition format.
+        Stage timings and call counts are labelled by stage; every counter
+        is a metric of its own.
+        '''
+        lines = []
+        for name, values in (('stage_seconds_total', self.timings),
+                             ('stage_calls_total', self.calls)):
+            metric = '%s_%s' % (prefix, name)
+            lines.append('# TYPE %s counter' % metric)
+            for stage, value in sorted(values.items()):
+                lines.append('%s{stage="%s"} %s' % (metric, stage, value))
+
+        for name, value in sorted(self.counters.items()):
+            metric = '%s_%s_total' % (prefix, name)
+            lines.append('# TYPE %s counter' % metric)
+            lines.append('%s %s' % (metric, value))
+        return '\n'.join(lines) + '\n'
@@ -1,17 +1,28 @@
 import re
 import logging
 import itertools
+import threading
+from StringIO import StringIO
 from datetime import datetime
 from abc import ABCMeta, abstractmethod
 
+# datetime.strptime imports _strptime the first time it's called, which
+# isn't thread safe; import it up front for parsers running on worker threads
+import _strptime
+
 import requests
-from BeautifulSoup import BeautifulSoup
+from BeautifulSoup import Tag
 
 import player
 import events
-from game import GameStatSet
+from backends import get_backend
+from game import GameStatSet, LazyGameStatSet
 from formation import Formation
-from mls_scraper.common import ABBREVIATION_MAP
+from log import get_default_logger
+from metrics import ParseMetrics
+from stats import COUNT_COLUMNS, TeamStats, parse_count
+from transport import get_default_transport
+from mls_scraper.common import ABBREVIATION_MAP, memoize
 
 
 class StatsParser(object):
@@ -20,17 +31,126 @@ class StatsParser(object):
     stat_url = None
     logger = None
     stat_html = None
+    metrics = None
+
+    # The stages iter_stats works through, in order, and the method that
+    # fills in each one
+    STAGES = (
+        ('general_info', 'get_general_info'),
+        ('team_stats', 'get_team_stats'),
+        ('players', 'get_players'),
+        ('events', 'get_events'),
+        ('formations', 'get_formations'),
+    )
+
+    # Sections of a match that can be requested on their own, with the
+    # sections each one needs loaded first and the method that fills it in
+    SECTIONS = {
+        'info': ((), 'get_general_info'),
+        'team_stats': ((), 'get_team_stats'),
+        'players': ((), 'get_players'),
+        'subs': (('players',), '_get_substitution_events'),
+        'goals': (('info', 'players'), '_get_goals'),
+        'bookings': (('info', 'players'), '_get_bookings'),
+        'formations': (('players',), 'get_formations'),
+    }
+
+    # The sections behind each lazily loaded GameStatSet attribute. The
+    # teams carry their stats, players and formation along with their names.
+    ATTRIBUTE_SECTIONS = {
+        'home_team': ('info', 'team_stats', 'players', 'formations'),
+        'away_team': ('info', 'team_stats', 'players', 'formations'),
+        'game_date': ('info',),
+        'goals': ('goals',),
+        'disciplinary_events': ('bookings',),
+        'subs': ('subs',),
+    }
+
+    _sections = None
+    _loaded_sections = None
+    _loading_sections = False
 
     def _generate_stats(self):
         ''' Executes the various methods to grab all of the stats, should
         stay pretty consistent from parser to parser
         '''
-        self._load_stat_html()
-        self.get_general_info()
-        self.get_team_stats()
-        self.get_players()
-        self.get_events()
-        self.get_formations()
+        for stage in self.iter_stats(prefetch=True):
+            pass
+
+    def iter_stats(self, prefetch=False):
+        ''' Loads the stats page and works through the STAGES one at a time,
+        yielding a (stage name, game) tuple as each one completes.
+
+        Stop iterating whenever you have what you need and the remaining
+        stages never run. In particular the formation page isn't fetched
+        until the formations stage starts, unless `prefetch` is set, in
+        which case it's fetched in the background from the start.
+
+        Each stage is timed in `metrics`, along with loading the stats page.
+        '''
+        if prefetch:
+            self._start_prefetch()
+        with self.metrics.time('load_stats'):
+            self._load_stat_html()
+        for stage, method in self.STAGES:
+            with self.metrics.time(stage):
+                getattr(self, method)()
+            yield stage, self.game
+
+    def _resolve_sections(self, sections):
+        ''' Expands the requested sections to include everything they
+        depend on
+        '''
+        resolved = set()
+        pending = list(sections)
+        while pending:
+            section = pending.pop()
+            if section not in self.SECTIONS:
+                raise ValueError('Unknown section: %s' % section)
+            if section not in resolved:
+                resolved.add(section)
+                pending.extend(self.SECTIONS[section][0])
+        return resolved
+
+    def _load_section(self, section):
+        ''' Loads a section, and the sections it depends on, unless that's
+        already been done. Only the requested sections are ever loaded.
+        '''
+        if section in self._loaded_sections or \
+                section not in self._sections:
+            return
+
+        dependencies, method = self.SECTIONS[section]
+        for dependency in dependencies:
+            self._load_section(dependency)
+        if self.stat_html is None:
+            with self.metrics.time('load_stats'):
+                self._load_stat_html()
+        with self.metrics.time(section):
+            getattr(self, method)()
+        self._loaded_sections.add(section)
+
+    def _load_attribute(self, attr):
+        ''' Loader for LazyGameStatSet: loads whatever's needed to read attr.
+        The getters read the game too while a section loads, but they only
+        rely on sections loaded ahead of them, so those reads are let through
+        untouched.
+        '''
+        with self._section_lock:
+            if self._loading_sections:
+                return
+
+            self._loading_sections = True
+            try:
+                for section in self.ATTRIBUTE_SECTIONS.get(attr, ()):
+                    self._load_section(section)
+            finally:
+                self._loading_sections = False
+
+    def _start_prefetch(self):
+        ''' Hook for kicking off any page fetches that can run in the
+        background while the stat html loads. Does nothing by default.
+        '''
 
     @abstractmethod
     def _load_stat_html(self):
@@ -63,8 +183,7 @@ class StatsParser(object):
         ''' Abstract method responsible for generating the statistics of the
         match. Stats we're looking for here are possession, shots, etc.
 
-        TODO: Create a true Stats class to store this info on instead of the
-        somewhat loose dict approach
+        Stats are stored on each team as a TeamStats.
         '''
 
     @abstractmethod
@@ -108,23 +227,107 @@ class StatsParser(object):
         ''' Abstract method for retrieving formation information '''
 
 
+# Elements of the stats page that the getters read, picked out in a single
+# pass over the document by _index_stat_html
+INDEXED_IDS = (
+    'stats-game', 'stats-starters', 'stats-goalkeeper', 'stats-subs',
+    'goals', 'disciplinary',
+)
+INDEXED_CLASSES = (
+    'home-team-title', 'away-team-title', 'game-data-date',
+    'game-data-timezone',
+)
+
+
+def _is_stat_region(name, attrs):
+    ''' Picks out the elements of the stats page that _index_stat_html looks
+    for, so a partial parse can skip building the rest of the page.
+    '''
+    for key, value in attrs:
+        if key == 'id' and value in INDEXED_IDS:
+            return True
+        if key == 'class' and name == 'div':
+            if any(x in INDEXED_CLASSES for x in value.split()):
+                return True
+    return False
+
+
+def _is_formation_region(name, attrs):
+    ''' Picks out the div holding both teams' formations '''
+    return name == 'div' and any(
+        key == 'class' and 'formations' in value.split()
+        for key, value in attrs)
+
+
+# A player in a formation reads like "7Sherjill MacDonald": shirt number,
+# then name
+_FORMATION_PLAYER_RE = re.compile(r'\d*(.*)')
+
+
+@memoize()
+def _formation_name(text):
+    ''' Turns a player's entry in a formation into the "First Last" name
+    they're looked up by, or '' if there's no name in it. Memoized.
+    '''
+    name = _FORMATION_PLAYER_RE.match(text).group(1).strip()
+    return player.full_name(name) if name else ''
+
+
+class _BackgroundFetch(object):
+    ''' Runs a fetch for a url on a background thread, holding on to the
+    result (or the exception) until someone asks for it.
+    '''
+
+    def __init__(self, url, fetch_func):
+        self.url = url
+        self._result = None
+        self._exception = None
+        self._thread = threading.Thread(target=self._run, args=(fetch_func,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, fetch_func):
+        try:
+            self._result = fetch_func(self.url)
+        except Exception as exc:
+            self._exception = exc
+
+    def result(self):
+        self._thread.join()
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+
 class MLSStatsParser(StatsParser):
 
     def __init__(self, stat_url, generate_stats=True, logger=None,
-                 log_level=logging.DEBUG):
+                 log_level=logging.DEBUG, transport=None, cache=None,
+                 backend=None, partial=False, sections=None):
         self.stat_url = stat_url
+        self.backend = get_backend(backend)
+        self.partial = partial
+        self.transport = transport if transport else get_default_transport()
+        self.cache = cache
         self.logger = logger
         self.stat_html = None
-        self.logger = logger
+        self._stat_index = None
+        self._indexed_html = None
+        self._formation_prefetch = None
+        self.metrics = ParseMetrics()
         if not self.logger:
-            logging.basicConfig(
-                filename='scraper.log',
-                level=log_level
-            )
-            self.logger = logging
-        self.game = GameStatSet(self.stat_url)
-        if generate_stats:
-            self._generate_stats()
+            self.logger = get_default_logger(log_level)
+        if sections is not None:
+            self._sections = self._resolve_sections(sections)
+            self._loaded_sections = set()
+            self._section_lock = threading.RLock()
+            self.game = LazyGameStatSet(self._load_attribute, self.stat_url)
+            self.game.metrics = self.metrics
+        else:
+            self.game = GameStatSet(self.stat_url)
+            self.game.metrics = self.metrics
+            if generate_stats:
+                self._generate_stats()
 
     def _parse_stat_table(self, table, outer_skip_func=None,
                           inner_parse_func=None):
@@ -150,6 +353,7 @@ class MLSStatsParser(StatsParser):
         stat_header = children[0]
         stat_key = [x.text for x in stat_header.findChildren() if x.text]
         stats = []
+        index_errors = []
         player_rows = children[1:]
         for player_row in player_rows:
             if outer_skip_func and outer_skip_func(player_row):
@@ -171,55 +375,156 @@ class MLSStatsParser(StatsParser):
                     continue
 
                 try:
-                    player_dict[stat_key[count - offset]] = child.text
+                    key = stat_key[count - offset]
+                    value = child.text
+                    if key in COUNT_COLUMNS:
+                        value = parse_count(value)
+                    player_dict[key] = value
                 except IndexError:
-                    # See these occasionally, still tracking the cause
-                    self.logger.info('IndexError in _parse_stat_table')
-                    self.logger.info('Index count: %s', count)
-                    self.logger.info('Key: %s' % stat_key)
+                    index_errors.append(count)
 
             stats.append(player_dict)
             player_row = player_row.findNext('tr')
 
+        if index_errors:
+            # See these occasionally, still tracking the cause. Reported
+            # once per table rather than once per cell.
+            self.metrics.count('index_errors', len(index_errors))
+            self.logger.info(
+                '%s IndexErrors in _parse_stat_table at index counts %s, '
+                'key: %s', len(index_errors), index_errors, stat_key)
+        self.metrics.count('rows_parsed', len(stats))
         return stats
 
+    def _fetch(self, url, headers=None):
+        ''' Fetches url through the response cache, if there is one, or
+        straight from the transport otherwise. Request headers only go to
+        the transport; the cache makes its own conditional requests.
+        '''
+        with self.metrics.time('fetch'):
+            if self.cache is None:
+                resp = self.transport.get(url, headers=headers)
+            else:
+                resp = self.cache.fetch(url, self.transport)
+
+        if getattr(resp, 'from_cache', False):
+            self.metrics.count('cache_hits')
+        else:
+            self.metrics.count('bytes_downloaded', len(resp.content or ''))
+        return resp
+
     def _load_stat_html(self):
+        ''' Loads the stats page and parses it '''
+        self._parse_stat_html(self._fetch_stat_html())
+
+    def _fetch_stat_html(self):
+        ''' Loads the stats page and returns its content '''
+        return self._fetch_stat_response().content
+
+    def _fetch_stat_response(self, headers=None):
         ''' Tries to load the stat_url. If the URL ends with "recap" it means
         MLS redirected us there for a variety of reasons. In those instances,
         we force our way back to the stats page.
+
+        Returns the response. With headers that make the request conditional
+        that may be a 304, meaning the page hasn't changed.
         '''
         try:
-            resp = requests.get(self.stat_url)
+            resp = self._fetch(self.stat_url, headers)
             if resp.url.endswith('recap'):
+                self.metrics.count('recap_redirects')
                 self.stat_url = resp.url.replace('recap', 'stats')
-                resp = requests.get(self.stat_url)
+                resp = self._fetch(self.stat_url, headers)
         except requests.RequestException:
             self.logger.exception("Unable to load URL")
             raise
 
+        if resp.status_code == 304 and headers:
+            return resp
         if not resp.status_code == 200:
             self.logger.error('Improper status code: %s', resp.status_code)
             raise requests.RequestException(
                 'MLS returned a %s status code' % resp.status_code)
 
-        self.stat_html = BeautifulSoup(resp.content)
+        return resp
+
+    def _parse_stat_html(self, html):
+        ''' Parses the stats page html and indexes it for the getters '''
+        with self.metrics.time('parse_stats_html'):
+            self.stat_html = self.backend.parse(
+                html, _is_stat_region if self.partial else None)
+        with self.metrics.time('index_stats_html'):
+            self._index_stat_html()
+
+    def _index_stat_html(self):
+        ''' Walks the stat html once and indexes the tables and divs the
+        getters need, so none of them have to search the whole document.
+
+        Tables that come in home/away pairs are indexed by side, based on
+        whether "home" or "away" shows up in their attributes. Everything
+        else is indexed under a side of None.
+        '''
+        index = {}
+        for tag in self.stat_html.recursiveChildGenerator():
+            if not isinstance(tag, Tag) or not tag.attrs:
+                continue
+
+            attrs = dict(tag.attrs)
+            tag_id = attrs.get('id')
+            if tag_id in INDEXED_IDS:
+                values = list(itertools.chain(*tag.attrs))
+                side = None
+                if any('home' in x for x in values):
+                    side = 'home'
+                elif any('away' in x for x in values):
+                    side = 'away'
+                entries = index.setdefault(tag_id, {})
+                if side or None not in entries:
+                    entries[side] = tag
+
+            if tag.name == 'div' and 'class' in attrs:
+                for class_name in attrs['class'].split():
+                    if class_name in INDEXED_CLASSES:
+                        index.setdefault(class_name, {}).setdefault(None, tag)
+
+        self._stat_index = index
+        self._indexed_html = self.stat_html
+
+    def _lookup(self, key, side=None):
+        ''' Returns the indexed element for key (and side, for home/away
+        tables), or None if the page didn't have one.
+        '''
+        if self._indexed_html is not self.stat_html:
+            self._index_stat_html()
+        return self._stat_index.get(key, {}).get(side)
+
+    def _lookup_tables(self, key):
+        ''' Returns the (home, away) pair of tables indexed under key '''
+        return self._lookup(key, 'home'), self._lookup(key, 'away')
+
+    def _start_prefetch(self):
+        ''' Starts fetching the formation page alongside the stats page. If
+        MLS redirects the stats page to a recap, the formation url changes
+        along with it and get_formations falls back to a fresh fetch.
+        '''
+        url = self._get_formation_url()
+        if url != self.stat_url:
+            self._formation_prefetch = _BackgroundFetch(
+                url, self._fetch_formation_html)
 
     def _get_home_team_name(self):
         ''' Retrieves home team name and stores it '''
-        self.game.home_team.name = self.stat_html.find(
-            'div', {'class': 'home-team-title'}).text
+        self.game.home_team.name = self._lookup('home-team-title').text
 
     def _get_away_team_name(self):
         ''' Retrieves away team name and stores it '''
-        self.game.away_team.name = self.stat_html.find(
-            'div', {'class': 'away-team-title'}).text
+        self.game.away_team.name = self._lookup('away-team-title').text
 
     def _get_game_start_time(self):
         ''' Retrieves and stores game start time '''
         time_str = '%s %s' % (
-            self.stat_html.find('div', {'class': 'game-data-date'}).text,
-            self.stat_html.find(
-                'div', {'class': 'game-data-timezone'}).text.split()[0]
+            self._lookup('game-data-date').text,
+            self._lookup('game-data-timezone').text.split()[0]
         )
         self.game.game_date = datetime.strptime(time_str, '%B %d, %Y %I:%M%p')
 
@@ -227,30 +532,21 @@ class MLSStatsParser(StatsParser):
         ''' Retrieves and stores all the main game stats, such as possession,
         shots on goal, and so on.
         '''
-        stats_table = self.stat_html.find(id='stats-game')
-        stats_row = stats_table.findNext('tr').findNext('tr')
-        home_stats = {}
-        away_stats = {}
-        while stats_row:
-            stat_title = stats_row.findChildren()[1].text
-            home_stats[stat_title] = stats_row.findChildren()[0].text
-            away_stats[stat_title] = stats_row.findChildren()[-1].text
-            stats_row = stats_row.findNext('tr')
+        stats_table = self._lookup('stats-game')
+        home_stats = TeamStats()
+        away_stats = TeamStats()
+        for stats_row in stats_table.findChildren('tr')[1:]:
+            cells = stats_row.findChildren()
+            stat_title = cells[1].text
+            home_stats.set_stat(stat_title, cells[0].text)
+            away_stats.set_stat(stat_title, cells[-1].text)
 
         self.game.home_team.stats = home_stats
         self.game.away_team.stats = away_stats
 
     def _get_starters(self):
         ''' Finds the home/away tables for starters and parses them out '''
-        home_table = None
-        away_table = None
-        for table in self.stat_html.findAll(id='stats-starters'):
-            if any(re.search(
-                    'home', x) for x in itertools.chain(*table.attrs)):
-                home_table = table
-            elif any(re.search(
-                    'away', x) for x in itertools.chain(*table.attrs)):
-                away_table = table
+        home_table, away_table = self._lookup_tables('stats-starters')
 
         if not away_table and not home_table:
             self.logger.error('Unable to parse starters')
@@ -262,15 +558,7 @@ class MLSStatsParser(StatsParser):
 
     def _get_keepers(self):
         ''' Finds the home/away table for keepers and parses them out '''
-        home_table = None
-        away_table = None
-        for table in self.stat_html.findAll(id='stats-goalkeeper'):
-            if any(re.search(
-                    'home', x) for x in itertools.chain(*table.attrs)):
-                home_table = table
-            elif any(re.search(
-                    'away', x) for x in itertools.chain(*table.attrs)):
-                away_table = table
+        home_table, away_table = self._lookup_tables('stats-goalkeeper')
 
         if not away_table and not home_table:
             self.logger.error('Unable to parse keepers')
@@ -290,15 +578,7 @@ class MLSStatsParser(StatsParser):
         def skip_starters(player_row):
             return player_row.findChildren('div', {'class': 'pos-arrow'})
 
-        home_table = None
-        away_table = None
-        for table in self.stat_html.findAll(id='stats-subs'):
-            if any(re.search(
-                    'home', x) for x in itertools.chain(*table.attrs)):
-                home_table = table
-            elif any(re.search(
-                    'away', x) for x in itertools.chain(*table.attrs)):
-                away_table = table
+        home_table, away_table = self._lookup_tables('stats-subs')
 
         if not away_table and not home_table:
             self.logger.error('Unable to parse subs')
@@ -320,25 +600,20 @@ class MLSStatsParser(StatsParser):
         subs = []
         for idx in xrange(1, len(children), 2):
             sub = events.Substitution()
-            if 'home' in table.attrMap['class']:
+            if 'home' in table.get('class', ''):
                 sub.team = self.game.home_team
             else:
                 sub.team = self.game.away_team
 
             off_row = children[idx]
             on_row = children[idx + 1]
-            off_player = '%s %s' % player.BasePlayer.parse_name(
-                off_row.findChildren()[3].text)
-            on_player = '%s %s' % player.BasePlayer.parse_name(
-                on_row.findChildren()[3].text)
+            off_player = player.full_name(off_row.findChildren()[3].text)
+            on_player = player.full_name(on_row.findChildren()[3].text)
             # If a player played 30 minutes, sub is at 31st minute for example
             sub_minute = int(off_row.findChildren()[4].text) + 1
             sub.time = sub_minute
-            for player_obj in sub.team.players:
-                if player_obj.name == off_player:
-                    sub.player_off = player_obj
-                elif player_obj.name == on_player:
-                    sub.player_on = player_obj
+            sub.player_off = sub.team.get_player(off_player)
+            sub.player_on = sub.team.get_player(on_player)
 
             subs.append(sub)
 
@@ -354,15 +629,7 @@ class MLSStatsParser(StatsParser):
               "minute": <int>}
         '''
 
-        home_table = None
-        away_table = None
-        for table in self.stat_html.findAll(id='stats-subs'):
-            if any(re.search(
-                    'home', x) for x in itertools.chain(*table.attrs)):
-                home_table = table
-            elif any(re.search(
-                    'away', x) for x in itertools.chain(*table.attrs)):
-                away_table = table
+        home_table, away_table = self._lookup_tables('stats-subs')
 
         if not away_table and not home_table:
             self.logger.error('Unable to parse subs')
@@ -381,31 +648,27 @@ class MLSStatsParser(StatsParser):
         else:
             goal.team = self.game.away_team
 
-        player_name = '%s %s' % player.BasePlayer.parse_name(
-            goal_dict['Player'])
+        player_name = player.full_name(goal_dict['Player'])
         if re.search('(OG)', goal_dict['Player']):
             goal.own_goal = True
-        for player_obj in goal.team.players:
-            if player_obj.name == player_name:
-                goal.player = player_obj
-                break
+        goal.player = goal.team.get_player(player_name)
 
         assists = []
         for player_info in goal_dict.get('(Assisted by)', '').split(','):
             if not player_info:
                 continue
-            player_name = '%s %s' % player.BasePlayer.parse_name(
+            player_name = player.full_name(
                 player_info.lstrip('(').rstrip(')'))
-            for player_obj in goal.team.players:
-                if player_obj.name == player_name:
-                    assists.append(player_obj)
+            player_obj = goal.team.get_player(player_name)
+            if player_obj:
+                assists.append(player_obj)
 
         goal.assisted_by = assists
         return goal
 
     def _get_goals(self):
         ''' Grabs the goals from the stats and stores them '''
-        goals_div = self.stat_html.find('div', {'id': 'goals'})
+        goals_div = self._lookup('goals')
         goals_dict = self._parse_stat_table(goals_div)
         goals = []
         for goal in goals_dict:
@@ -423,22 +686,19 @@ class MLSStatsParser(StatsParser):
         else:
             booking.team = self.game.away_team
 
-        player_name = '%s %s' % player.BasePlayer.parse_name(
-            booking_dict['Player'])
-        for player_obj in booking.team.players:
-            if player_obj.name == player_name:
-                booking.player = player_obj
-                break
+        player_name = player.full_name(booking_dict['Player'])
+        booking.player = booking.team.get_player(player_name)
 
         # Sometimes bench warmers get booked
         if not booking.player:
             bench_player = player.Player()
+            bench_player.page_name = booking_dict['Player']
             bench_player.first_name, bench_player.last_name = bench_player.parse_name(
                 booking_dict['Player'])
             bench_player.position = 'S'
             bench_player.number = -1
             booking.player = bench_player
-            booking.team.subs.append(bench_player)
+            booking.team.add_sub(bench_player)
 
         booking.reason = booking_dict['Reason']
         booking.card_color = booking_dict['card_color']
@@ -452,7 +712,7 @@ class MLSStatsParser(StatsParser):
         def get_card_color(count, child):
             player = {}
             try:
-                class_name = child.findChild().attrMap.get('class')
+                class_name = child.findChild().get('class')
                 if class_name in (
                         'timeline-red', 'timeline-yellow',
                         'timeline-second-yellow'):
@@ -462,7 +722,7 @@ class MLSStatsParser(StatsParser):
 
             return player, False
 
-        disciplinary_div = self.stat_html.find('div', {'id': 'disciplinary'})
+        disciplinary_div = self._lookup('disciplinary')
         events = self._parse_stat_table(
             disciplinary_div,
             inner_parse_func=get_card_color
@@ -472,22 +732,25 @@ class MLSStatsParser(StatsParser):
         ]
 
     def _get_formation_contents(self, l, formatter=lambda s: s):
-        """Fetch the contents from a soup object."""
+        """Fetch the contents from a soup object.
 
-        if not hasattr(l, 'contents'):
-            s = l
-        else:
-            s = ""
-
-            for e in l.contents:
-                s += self._get_formation_contents(e)
-        return formatter(s.strip())
+        Every piece of text inside it, stripped and run together, gathered
+        in a single walk over the element's descendants.
+        """
+        if not isinstance(l, Tag):
+            return formatter(l.strip())
+        return formatter(u''.join(
+            x.strip() for x in l.recursiveChildGenerator()
+            if not isinstance(x, Tag)).strip())
 
     def _process_formation(self, soup, home=False):
-        strip_leading_digits = lambda s: re.match("\d*(.*)", s).groups()[0].strip()
-        extract_player = lambda tag: strip_leading_digits(
-            self._get_formation_contents(tag))
-        extract_line = lambda l: [extract_player(e) for e in l if extract_player(e)]
+        def extract_line(l):
+            names = []
+            for e in l:
+                name = _formation_name(self._get_formation_contents(e))
+                if name:
+                    names.append(name)
+            return names
 
         if home:
             team = self.game.home_team
@@ -499,20 +762,19 @@ class MLSStatsParser(StatsParser):
         for line in lines[:-1]:
             form_line = extract_line(line)
             player_list = []
-            for item in form_line:
-                player_name = '%s %s' % player.BasePlayer.parse_name(item)
-                for player_obj in team.players:
-                    if player_name == player_obj.name:
-                        player_list.append(player_obj)
+            for player_name in form_line:
+                player_obj = team.get_player(player_name)
+                if player_obj:
+                    player_list.append(player_obj)
 
             formation.append(player_list)
 
         formation.reverse()
         return formation
 
-    def _parse_formation_url(self, url):
+    def _fetch_formation_html(self, url):
         try:
-            resp = requests.get(url)
+            resp = self._fetch(url)
         except requests.RequestException:
             self.logger.exception("Unable to load formation URL: %s", url)
             raise
@@ -522,20 +784,89 @@ class MLSStatsParser(StatsParser):
             raise requests.RequestException(
                 'MLS returned a %s status code' % resp.status_code)
 
-        return self._parse_formation_html(resp.content)
+        return resp.content
+
+    def _parse_formation_url(self, url):
+        ''' Parses the formation page at url, using the prefetched page when
+        one was started for the same url.
+        '''
+        prefetch = self._formation_prefetch
+        self._formation_prefetch = None
+        if prefetch and prefetch.url == url:
+            html = prefetch.result()
+        else:
+            html = self._fetch_formation_html(url)
+
+        return self._parse_formation_html(html)
 
     def _parse_formation_html(self, html):
-        soup = BeautifulSoup(html)
-        formations = soup.find('div', {'class': 'formations'})
+        with self.metrics.time('parse_formation_html'):
+            soup = self.backend.parse(
+                html, _is_formation_region if self.partial else None)
+        # Matching on tag.attrs rather than an attrs dict, which BeautifulSoup
+        # 3 checks with Tag.get, and that searches the tag's whole subtree
+        # for every tag it's asked about before it has an attrMap
+        formations = soup.find(
+            lambda tag: _is_formation_region(tag.name, tag.attrs))
         home, away = formations.findAll('div', recursive=False)
         return {
             'home': Formation(self._process_formation(home, True)),
             'away': Formation(self._process_formation(away))
         }
 
+    def _get_formation_url(self):
+        return self.stat_url.replace('/stats', '/formation')
+
     def get_formations(self):
         ''' Parses out and retreives Formation objects '''
-        url = self.stat_url.replace('/stats', '/formation')
-        results = self._parse_formation_url(url)
+        results = self._parse_formation_url(self._get_formation_url())
+        self.game.home_team.formation = results['home']
+        self.game.away_team.formation = results['away']
+
+
+class SavedPageParser(MLSStatsParser):
+    ''' Parses a match from pages that have already been fetched, without
+    touching the network. The stats page (and optionally the formation
+    page) can each be a path or an open file; use from_html for pages
+    already in memory. Without a formation page the teams' formations are
+    left as None.
+
+    stat_url defaults to the stats page's path, or the file's name.
+    '''
+
+    def __init__(self, stats, formation=None, stat_url=None, **kwargs):
+        self.stats_page = stats
+        self.formation_page = formation
+        if stat_url is None:
+            stat_url = stats if isinstance(stats, basestring) else getattr(
+                stats, 'name', None)
+        super(SavedPageParser, self).__init__(stat_url, **kwargs)
+
+    @classmethod
+    def from_html(cls, stats_html, formation_html=None, stat_url=None,
+                  **kwargs):
+        ''' Parses a match from the html of its pages '''
+        formation = None
+        if formation_html is not None:
+            formation = StringIO(formation_html)
+        return cls(StringIO(stats_html), formation, stat_url, **kwargs)
+
+    def _read(self, page):
+        if hasattr(page, 'read'):
+            return page.read()
+        with open(page, 'rb') as page_file:
+            return page_file.read()
+
+    def _load_stat_html(self):
+        self._parse_stat_html(self._read(self.stats_page))
+
+    def _start_prefetch(self):
+        pass
+
+    def get_formations(self):
+        if self.formation_page is None:
+            return
+
+        results = self._parse_formation_html(self._read(self.formation_page))
         self.game.home_team.formation = results['home']
         self.game.away_team.formation = results['away']
@@ -1,16 +1,20 @@
+from mls_scraper.common import memoize
+
+
+@memoize()
+def full_name(name):
+    ''' Turns a name off the page into the "First Last" form players are
+    looked up by (see BasePlayer.name). Memoized.
+    '''
+    return u'%s %s' % BasePlayer.parse_name(name)
 
 
 class BasePlayer(object):
 
-    first_name = None
-    last_name = None
-    number = None
-    position = None
-    shots = 0
-    minutes = 0
-    assists = 0
-    fouls_commited = 0
-    fouls_suffered = 0
+    __slots__ = (
+        'first_name', 'last_name', 'number', 'position', 'shots', 'minutes',
+        'assists', 'fouls_commited', 'fouls_suffered', 'page_name',
+    )
 
     def __unicode__(self):
         return u'%s %s' % (self.first_name, self.last_name)
@@ -19,7 +23,19 @@ class BasePlayer(object):
         return self.__unicode__()
 
     def __init__(self, stats_dict=None):
+        self.first_name = None
+        self.last_name = None
+        self.number = None
+        self.position = None
+        self.shots = 0
+        self.minutes = 0
+        self.assists = 0
+        self.fouls_commited = 0
+        self.fouls_suffered = 0
+        # The name as the page has it; `name` is cut down to two words
+        self.page_name = None
         if stats_dict:
+            self.page_name = stats_dict['Player']
             self.first_name, self.last_name = self.parse_name(
                 stats_dict['Player'])
             self.number = stats_dict['#']
@@ -33,9 +49,13 @@ class BasePlayer(object):
             self.shots = stats_dict.get('SHT', 0)
             self.assists = stats_dict.get('A', 0)
 
-    @classmethod
-    def parse_name(cls, name):
-        ''' Takes a player name and generates first/last names '''
+    @staticmethod
+    @memoize()
+    def parse_name(name):
+        ''' Takes a player name and generates first/last names. Results are
+        memoized, so every player parsed from the same text shares the same
+        name strings.
+        '''
         player_name = name.split()
         if len(player_name) == 1:
             first_name = last_name = player_name[0]
@@ -52,13 +72,14 @@ class BasePlayer(object):
 
 class Player(BasePlayer):
 
-    goals = 0
-    shots_on_goal = 0
-    corners = 0
-    offsides = 0
+    __slots__ = ('goals', 'shots_on_goal', 'corners', 'offsides')
 
     def __init__(self, stats_dict=None):
         super(Player, self).__init__(stats_dict)
+        self.goals = 0
+        self.shots_on_goal = 0
+        self.corners = 0
+        self.offsides = 0
         if stats_dict:
             self.goals = stats_dict['G']
             self.shots_on_goal = stats_dict['SOG']
@@ -68,11 +89,12 @@ class Player(BasePlayer):
 
 class Keeper(BasePlayer):
 
-    saves = 0
-    goals_against = 0
+    __slots__ = ('saves', 'goals_against')
 
     def __init__(self, stats_dict=None):
         super(Keeper, self).__init__(stats_dict)
+        self.saves = 0
+        self.goals_against = 0
         if stats_dict:
             self.saves = stats_dict['SV']
             self.goals_against = stats_dict['GA']
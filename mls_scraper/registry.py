@@ -0,0 +1,88 @@
+import re
+import unicodedata
+
+from mls_scraper.common import memoize
+
+_PARENTHESIZED_RE = re.compile(r'\(.*?\)')
+_PUNCTUATION_RE = re.compile(r'[^\w\s]', re.UNICODE)
+
+
+@memoize()
+def normalize_name(name):
+    ''' Boils a player's name down to a key that spelling variants share:
+    accents folded ("Mejia" with or without its accent), case, punctuation
+    and spacing ignored ("Jean-Marc" and "Jean Marc"), and notes like
+    "(OG)" dropped. Every part of the name is kept, so multi-part surnames
+    ("Van der Berg") still tell players apart. Memoized.
+    '''
+    text = name
+    if isinstance(text, str):
+        text = text.decode('utf-8', 'replace')
+    text = unicodedata.normalize('NFKD', text)
+    text = u''.join(x for x in text if not unicodedata.combining(x))
+    text = _PARENTHESIZED_RE.sub(u' ', text)
+    text = _PUNCTUATION_RE.sub(u' ', text)
+    return u' '.join(text.lower().split())
+
+
+class PlayerRegistry(object):
+    ''' Gives every player seen across a season's worth of matches a stable
+    id, however their name happened to be spelled in each match.
+
+    Names are matched on normalize_name, so looking a player up is a
+    dictionary hit once a spelling has been seen. Ids are handed out in the
+    order players are first seen, and `names` holds the spelling each
+    player was first seen with. Variants that normalizing doesn't catch can
+    be tied together with alias().
+    '''
+
+    def __init__(self):
+        self.names = []
+        self._ids = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, name):
+        ''' Returns the id of the player called name, or None '''
+        return self._ids.get(normalize_name(name))
+
+    def player_id(self, name):
+        ''' Returns the id of the player called name, registering them if
+        they're new
+        '''
+        key = normalize_name(name)
+        try:
+            return self._ids[key]
+        except KeyError:
+            self.names.append(name)
+            return self._ids.setdefault(key, len(self.names) - 1)
+
+    def name(self, player_id):
+        return self.names[player_id]
+
+    def canonical_name(self, name):
+        ''' Returns the spelling the player called name was first seen
+        with, registering them if they're new
+        '''
+        return self.names[self.player_id(name)]
+
+    def alias(self, variant, name):
+        ''' Makes variant another name for the player called name '''
+        self._ids[normalize_name(variant)] = self.player_id(name)
+
+    def add_player(self, player_obj):
+        ''' Registers a Player under their whole name as the page has it
+        (`name` only keeps the first two words), and returns their id
+        '''
+        return self.player_id(player_obj.page_name or player_obj.name)
+
+    def add_game(self, game):
+        ''' Registers everyone who played in game, and returns their ids
+        keyed by id() of the Player objects
+        '''
+        ids = {}
+        for team in (game.home_team, game.away_team):
+            for player_obj in team.players:
+                ids[id(player_obj)] = self.add_player(player_obj)
+        return ids
@@ -0,0 +1,286 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from player import Keeper
+from stats import TEAM_STATS
+
+
+# Player fields copied into the player rows. Keeper-only fields are 0 for
+# outfield players and the other way around.
+PLAYER_STATS = (
+    'minutes', 'goals', 'assists', 'shots', 'shots_on_goal',
+    'fouls_commited', 'fouls_suffered', 'corners', 'offsides', 'saves',
+    'goals_against',
+)
+
+# String columns are stored as int32 codes into SeasonStore.strings, with -1
+# standing in for None
+MATCH_COLUMNS = (
+    ('match_id', 'i4'), ('game_date', 'M8[s]'),
+    ('home_team', 'i4'), ('away_team', 'i4'),
+)
+PLAYER_COLUMNS = (
+    ('match', 'i4'), ('team', 'i4'), ('player', 'i4'), ('number', 'i4'),
+    ('position', 'i4'), ('keeper', '?'), ('starter', '?'),
+) + tuple((x, 'i4') for x in PLAYER_STATS)
+TEAM_COLUMNS = (
+    ('match', 'i4'), ('team', 'i4'), ('home', '?'),
+) + tuple((attr, 'f8') for title, attr, convert in TEAM_STATS)
+GOAL_COLUMNS = (
+    ('match', 'i4'), ('team', 'i4'), ('minute', 'i4'), ('player', 'i4'),
+    ('own_goal', '?'), ('assists', 'i4'),
+)
+BOOKING_COLUMNS = (
+    ('match', 'i4'), ('team', 'i4'), ('minute', 'i4'), ('player', 'i4'),
+    ('card_color', 'i4'),
+)
+SUB_COLUMNS = (
+    ('match', 'i4'), ('team', 'i4'), ('minute', 'i4'), ('player_on', 'i4'),
+    ('player_off', 'i4'),
+)
+
+TABLES = (
+    ('matches', MATCH_COLUMNS),
+    ('players', PLAYER_COLUMNS),
+    ('teams', TEAM_COLUMNS),
+    ('goals', GOAL_COLUMNS),
+    ('bookings', BOOKING_COLUMNS),
+    ('subs', SUB_COLUMNS),
+)
+
+
+class ColumnTable(object):
+    ''' A table kept as one numpy array per column. Rows are appended one
+    at a time to plain lists and only turned into arrays (in one go) when a
+    column is read.
+    '''
+
+    def __init__(self, columns, arrays=None):
+        self.columns = columns
+        self._arrays = {}
+        self._pending = dict((name, []) for name, dtype in columns)
+        for name, dtype in columns:
+            if arrays is not None:
+                self._arrays[name] = numpy.asarray(arrays[name], dtype=dtype)
+            else:
+                self._arrays[name] = numpy.zeros(0, dtype=dtype)
+
+    def append(self, **row):
+        for name, dtype in self.columns:
+            self._pending[name].append(row[name])
+
+    def _flush(self):
+        if not self._pending[self.columns[0][0]]:
+            return
+
+        for name, dtype in self.columns:
+            self._arrays[name] = numpy.concatenate([
+                self._arrays[name],
+                numpy.array(self._pending[name], dtype=dtype),
+            ])
+            self._pending[name] = []
+
+    def __getitem__(self, name):
+        self._flush()
+        return self._arrays[name]
+
+    def __len__(self):
+        return (len(self._arrays[self.columns[0][0]]) +
+                len(self._pending[self.columns[0][0]]))
+
+
+class SeasonStore(object):
+    ''' Parsed games flattened into columnar tables (matches, players, teams,
+    goals, bookings and subs), so stats over a whole season can be worked
+    out with numpy instead of walking GameStatSet objects.
+
+    Every row carries the index of its match in the matches table. Names
+    (teams, players, positions, card colors, match ids) are stored as codes
+    into `strings`; use name() to turn a code back into text. Stores are
+    saved to and loaded from a single compressed .npz file.
+
+    Give the store a PlayerRegistry and players are stored under the
+    registry's spelling of their name, so a player whose name is spelled
+    differently from one match to the next still adds up to one player.
+    '''
+
+    def __init__(self, strings=None, arrays=None, registry=None):
+        if numpy is None:
+            raise ImportError('SeasonStore requires numpy')
+
+        self.registry = registry
+        self.strings = list(strings) if strings else []
+        self._codes = dict((x, i) for i, x in enumerate(self.strings))
+        for table, columns in TABLES:
+            table_arrays = None
+            if arrays is not None:
+                table_arrays = dict(
+                    (name, arrays['%s.%s' % (table, name)])
+                    for name, dtype in columns)
+            setattr(self, table, ColumnTable(columns, table_arrays))
+
+    def code(self, value):
+        ''' Returns the code for value in the string table, adding it if
+        it's new. None is always -1.
+        '''
+        if value is None:
+            return -1
+        try:
+            return self._codes[value]
+        except KeyError:
+            self._codes[value] = len(self.strings)
+            self.strings.append(value)
+            return self._codes[value]
+
+    def name(self, code):
+        return None if code < 0 else self.strings[code]
+
+    def names(self, codes):
+        ''' Turns an array of codes back into a list of strings '''
+        return [self.name(x) for x in codes]
+
+    def _player_code(self, player_obj):
+        if not player_obj:
+            return -1
+        if self.registry is not None:
+            return self.code(
+                self.registry.name(self.registry.add_player(player_obj)))
+        return self.code(player_obj.page_name or player_obj.name)
+
+    def add_game(self, game, match_id=None):
+        ''' Appends a parsed GameStatSet to the store and returns its index
+        in the matches table. match_id defaults to the game's stat url.
+        '''
+        match = len(self.matches)
+        game_date = numpy.datetime64('NaT')
+        if game.game_date:
+            game_date = numpy.datetime64(game.game_date, 's')
+        self.matches.append(
+            match_id=self.code(match_id or game.stat_url),
+            game_date=game_date,
+            home_team=self.code(game.home_team.name),
+            away_team=self.code(game.away_team.name),
+        )
+
+        for team, home in ((game.home_team, True), (game.away_team, False)):
+            self._add_team(match, team, home)
+
+        for goal in game.goals:
+            self.goals.append(
+                match=match, team=self.code(goal.team.name),
+                minute=goal.time, player=self._player_code(goal.player),
+                own_goal=goal.own_goal, assists=len(goal.assisted_by),
+            )
+
+        for booking in game.disciplinary_events:
+            self.bookings.append(
+                match=match, team=self.code(booking.team.name),
+                minute=booking.time,
+                player=self._player_code(booking.player),
+                card_color=self.code(booking.card_color),
+            )
+
+        for sub in game.subs:
+            self.subs.append(
+                match=match, team=self.code(sub.team.name), minute=sub.time,
+                player_on=self._player_code(sub.player_on),
+                player_off=self._player_code(sub.player_off),
+            )
+
+        return match
+
+    def _add_team(self, match, team, home):
+        team_code = self.code(team.name)
+        team_row = dict(match=match, team=team_code, home=home)
+        for title, attr, convert in TEAM_STATS:
+            value = getattr(team.stats, attr, None)
+            team_row[attr] = numpy.nan if value is None else value
+        self.teams.append(**team_row)
+
+        starters = set(id(x) for x in team.starters)
+        for player_obj in team.players:
+            row = dict(
+                match=match, team=team_code,
+                player=self._player_code(player_obj),
+                number=player_obj.number if player_obj.number else 0,
+                position=self.code(player_obj.position),
+                keeper=isinstance(player_obj, Keeper),
+                starter=id(player_obj) in starters,
+            )
+            for attr in PLAYER_STATS:
+                row[attr] = getattr(player_obj, attr, None) or 0
+            self.players.append(**row)
+
+    def save(self, path):
+        ''' Writes the store to path as a compressed .npz file '''
+        arrays = {'strings': numpy.array(self.strings, dtype=unicode)}
+        for table, columns in TABLES:
+            for name, dtype in columns:
+                arrays['%s.%s' % (table, name)] = getattr(self, table)[name]
+        with open(path, 'wb') as npz_file:
+            numpy.savez_compressed(npz_file, **arrays)
+
+    @classmethod
+    def load(cls, path, registry=None):
+        ''' Reads back a store written by save. Pass the registry the
+        store was built with so later matches join the same players
+        '''
+        arrays = numpy.load(path)
+        try:
+            return cls(arrays['strings'].tolist(), arrays, registry=registry)
+        finally:
+            arrays.close()
+
+    def player_totals(self, stats=PLAYER_STATS):
+        ''' Sums stats per player over every match in the store. Returns a
+        dict of equal-length arrays: "player" (names), "appearances", and
+        one array per stat.
+        '''
+        players, index = numpy.unique(
+            self.players['player'], return_inverse=True)
+        totals = {
+            'player': numpy.array(self.names(players), dtype=object),
+            'appearances': numpy.bincount(index, minlength=len(players)),
+        }
+        for stat in stats:
+            totals[stat] = numpy.bincount(
+                index, weights=self.players[stat], minlength=len(players)
+            ).astype(numpy.int64)
+        return totals
+
+    def per_90(self, stats=PLAYER_STATS, totals=None):
+        ''' Works out each player's stats per 90 minutes played. Players
+        who never got on the pitch get NaN. `totals` must include minutes.
+        '''
+        if totals is None:
+            totals = self.player_totals(tuple(set(stats) | {'minutes'}))
+        minutes = totals['minutes'].astype(numpy.float64)
+        rates = {'player': totals['player']}
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            for stat in stats:
+                rates[stat] = numpy.where(
+                    minutes > 0, totals[stat] * 90.0 / minutes, numpy.nan)
+        return rates
+
+    def team_averages(self, stat='possession'):
+        ''' Averages a team stat per team, over the matches it was recorded
+        in. Returns a dict with "team" (names), "matches" and the average
+        under stat.
+        '''
+        values = self.teams[stat]
+        recorded = ~numpy.isnan(values)
+        teams, index = numpy.unique(
+            self.teams['team'][recorded], return_inverse=True)
+        counts = numpy.bincount(index, minlength=len(teams))
+        sums = numpy.bincount(
+            index, weights=values[recorded], minlength=len(teams))
+        return {
+            'team': numpy.array(self.names(teams), dtype=object),
+            'matches': counts,
+            stat: sums / counts,
+        }
+
+    def team_possession(self):
+        return self.team_averages('possession')
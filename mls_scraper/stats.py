@@ -0,0 +1,74 @@
+def parse_count(text):
+    ''' Converts a count off the page ("12") to an int. Returns None if
+    the page didn't have a number there.
+    '''
+    try:
+        return int(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_percent(text):
+    ''' Converts a percentage off the page ("56.9%") to a float (56.9).
+    Returns None if the page didn't have a number there.
+    '''
+    try:
+        return float(text.strip().rstrip('%'))
+    except (AttributeError, ValueError):
+        return None
+
+
+# Columns of the player tables that hold numbers rather than text
+COUNT_COLUMNS = frozenset([
+    '#', 'MIN', 'G', 'A', 'SHT', 'SOG', 'FC', 'FS', 'CK', 'OFF', 'SV', 'GA',
+    'S',
+])
+
+# Rows of the team stats table, as (title on the page, attribute, converter)
+TEAM_STATS = (
+    ('Possession', 'possession', parse_percent),
+    ('Attempts on Goal', 'attempts_on_goal', parse_count),
+    ('Shots on Target', 'shots_on_target', parse_count),
+    ('Shots off Target', 'shots_off_target', parse_count),
+    ('Blocked Shots', 'blocked_shots', parse_count),
+    ('Corner Kicks', 'corner_kicks', parse_count),
+    ('Open Play Crosses', 'open_play_crosses', parse_count),
+    ('Offsides', 'offsides', parse_count),
+    ('Fouls', 'fouls', parse_count),
+    ('First Yellow Cards', 'first_yellow_cards', parse_count),
+    ('Second Yellow Cards', 'second_yellow_cards', parse_count),
+    ('Red Cards', 'red_cards', parse_count),
+    ('Total Pass', 'total_passes', parse_count),
+    ('Passing Accuracy %', 'passing_accuracy', parse_percent),
+    ('Duels Won', 'duels_won', parse_count),
+    ('Duels Won %', 'duels_won_percent', parse_percent),
+)
+_TEAM_STAT_TITLES = dict((title, (attr, convert))
+                         for title, attr, convert in TEAM_STATS)
+
+
+class TeamStats(object):
+    ''' A team's stats for a match: possession, shots and so on. Counts are
+    ints and percentages are floats (56.9 for 56.9%). Stats the page didn't
+    have are None, and any rows we don't know about end up in `other`,
+    keyed by their title, as the text from the page.
+    '''
+
+    __slots__ = tuple(attr for title, attr, convert in TEAM_STATS) + (
+        'other',)
+
+    def __init__(self, **stats):
+        for title, attr, convert in TEAM_STATS:
+            setattr(self, attr, None)
+        self.other = {}
+        for attr, value in stats.items():
+            setattr(self, attr, value)
+
+    def set_stat(self, title, text):
+        ''' Converts text from the row titled `title` and stores it '''
+        try:
+            attr, convert = _TEAM_STAT_TITLES[title]
+        except KeyError:
+            self.other[title] = text
+        else:
+            setattr(self, attr, convert(text))
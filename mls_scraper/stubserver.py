@@ -0,0 +1,175 @@
+import os
+import time
+import socket
+import hashlib
+import threading
+import BaseHTTPServer
+import SocketServer
+
+
+FIXTURE_DIR = os.path.dirname(__file__)
+
+
+def load_fixture(name):
+    ''' Reads one of the bundled HTML fixtures and returns its raw content '''
+    with open(os.path.join(FIXTURE_DIR, name), 'rb') as fixture:
+        return fixture.read()
+
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn,
+                           BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+
+class _StubRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.stub.record_connection(self.connection)
+
+    def finish(self):
+        try:
+            BaseHTTPServer.BaseHTTPRequestHandler.finish(self)
+        finally:
+            self.server.stub.record_disconnection(self.connection)
+
+    def _send_empty(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        stub = self.server.stub
+        stub.record_request(self.path)
+        if stub.delay:
+            time.sleep(stub.delay)
+
+        status = stub.failure_for(self.path)
+        if status:
+            self._send_empty(status)
+            return
+
+        content = stub.page_for(self.path)
+        if content is None:
+            self._send_empty(404)
+            return
+
+        etag = '"%s"' % hashlib.md5(content).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self._send_empty(304)
+            return
+
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        # Keep test output quiet
+        pass
+
+
+class StubServer(object):
+    ''' A tiny local stand-in for the MLS site, serving the bundled
+    test_stats.html and test_formation.html fixtures. Any path ending with
+    "/stats" gets the stats page, any path ending with "/formation" gets the
+    formation page, and everything else is a 404. Pages carry an ETag, and
+    conditional requests for unchanged pages get a 304.
+
+    Optionally sleeps for `delay` seconds before answering each request, which
+    makes it handy for simulating network latency. Transient failures can be
+    queued up per page with fail().
+    '''
+
+    def __init__(self, pages=None, delay=0):
+        if pages is None:
+            pages = {
+                'stats': load_fixture('test_stats.html'),
+                'formation': load_fixture('test_formation.html'),
+            }
+        self.pages = pages
+        self.delay = delay
+        self.requests = []
+        self.connections = 0
+        self._failures = {}
+        self._open = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return 'http://%s:%s' % (host, port)
+
+    def url(self, path):
+        return '%s/%s' % (self.base_url, path.lstrip('/'))
+
+    def record_request(self, path):
+        with self._lock:
+            self.requests.append(path)
+
+    def record_connection(self, connection):
+        with self._lock:
+            self.connections += 1
+            self._open[connection] = threading.current_thread()
+
+    def record_disconnection(self, connection):
+        with self._lock:
+            self._open.pop(connection, None)
+
+    def fail(self, page, status=503, count=1):
+        ''' Answers the next `count` requests for page with `status` '''
+        with self._lock:
+            self._failures.setdefault(page, []).extend([status] * count)
+
+    def _page_name(self, path):
+        return path.split('?')[0].rstrip('/').rsplit('/', 1)[-1]
+
+    def failure_for(self, path):
+        with self._lock:
+            failures = self._failures.get(self._page_name(path))
+            if failures:
+                return failures.pop(0)
+
+    def page_for(self, path):
+        return self.pages.get(self._page_name(path))
+
+    def start(self):
+        self._server = _ThreadingHTTPServer(
+            ('127.0.0.1', 0), _StubRequestHandler)
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        ''' Stops the server, hanging up on any kept-alive connections so
+        their handler threads finish now rather than at interpreter exit
+        '''
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            self._thread = None
+
+        with self._lock:
+            open_connections = self._open.items()
+        for connection, thread in open_connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            thread.join(1)
@@ -1,21 +1,44 @@
+from stats import TeamStats
+
+
+def _player_list(attr):
+    ''' A property for one of Team's player lists that drops the team's
+    player index whenever the list is replaced
+    '''
+    private_attr = '_%s' % attr
+
+    def get_players(self):
+        return getattr(self, private_attr)
+
+    def set_players(self, players):
+        setattr(self, private_attr, players)
+        self._players_by_name = None
+
+    return property(get_players, set_players)
 
 
 class Team(object):
 
-    name = None
-    starters = []
-    keepers = []
-    subs = []
-    stats = {}
-    formation = None
+    __slots__ = (
+        'name', 'stats', 'formation', '_starters', '_keepers', '_subs',
+        '_players_by_name', '_players_by_number', '_indexed_counts',
+    )
+
+    starters = _player_list('starters')
+    keepers = _player_list('keepers')
+    subs = _player_list('subs')
 
     def __init__(self, name=None, starters=None, keepers=None,
                  subs=None, stats=None):
+        self._players_by_name = None
+        self._players_by_number = None
+        self._indexed_counts = None
         self.name = name
         self.starters = starters if starters else []
         self.keepers = keepers if keepers else []
-        self.stats = stats if stats else {}
+        self.stats = stats if stats else TeamStats()
         self.subs = subs if subs else []
+        self.formation = None
 
     def __unicode__(self):
         return u'%s' % self.name
@@ -26,3 +49,45 @@ class Team(object):
     @property
     def players(self):
         return self.starters + self.keepers + self.subs
+
+    def _player_counts(self):
+        return len(self._starters), len(self._keepers), len(self._subs)
+
+    def _index_players(self):
+        ''' Builds the name and number lookups for get_player and
+        get_player_by_number. Rebuilt whenever one of the player lists is
+        replaced, or has changed size since the last build. If two players
+        share a name or number, the first one listed wins.
+        '''
+        counts = self._player_counts()
+        if self._players_by_name is not None and \
+                counts == self._indexed_counts:
+            return
+
+        by_name = {}
+        by_number = {}
+        for player in self.players:
+            by_name.setdefault(player.name, player)
+            by_number.setdefault(player.number, player)
+
+        self._players_by_name = by_name
+        self._players_by_number = by_number
+        self._indexed_counts = counts
+
+    def get_player(self, name):
+        ''' Returns the player whose name ("First Last") is name, or None '''
+        self._index_players()
+        return self._players_by_name.get(name)
+
+    def get_player_by_number(self, number):
+        ''' Returns the player wearing number, or None '''
+        self._index_players()
+        return self._players_by_number.get(number)
+
+    def add_sub(self, player):
+        ''' Adds player to the subs, keeping the player index up to date '''
+        self._index_players()
+        self._subs.append(player)
+        self._players_by_name.setdefault(player.name, player)
+        self._players_by_number.setdefault(player.number, player)
+        self._indexed_counts = self._player_counts()
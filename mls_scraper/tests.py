@@ -2,12 +2,72 @@
 # -*- coding: utf-8 -*-
 
 import unittest
+import itertools
+import json
+import Queue
+import logging
+import multiprocessing
 import os
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from StringIO import StringIO
+from datetime import date, timedelta
 
-from mock import Mock
+from mock import Mock, patch
 from BeautifulSoup import BeautifulSoup
 
+import backends
+import cli
+import benchmark
+import discovery
+import events
+import log
+import batch
 import parser
+import requests
+import season
+from live import LiveTracker, StatChange
+from metrics import ParseMetrics
+from archive import MatchArchive, INDEX_RECORD
+from backfill import BackfillJob
+from cache import CachedResponse, ResponseCache
+from events import Goal
+from game import GameStatSet
+from common import memoize
+from player import Player, full_name
+from registry import PlayerRegistry, normalize_name
+from stats import TeamStats
+from stubserver import StubServer, load_fixture
+from team import Team
+from transport import RateLimiter, Transport
+
+
+def _fields(obj):
+    names = itertools.chain(
+        *[getattr(x, '__slots__', ()) for x in type(obj).__mro__])
+    return dict((x, getattr(obj, x)) for x in names)
+
+
+def summarize_game(game):
+    ''' Boils a GameStatSet down to plain values that can be compared '''
+    teams = []
+    for team in (game.home_team, game.away_team):
+        teams.append((
+            team.name, _fields(team.stats),
+            [_fields(x) for x in team.players],
+            [[x.name for x in line] for line in team.formation.players],
+        ))
+    return (
+        teams, game.game_date,
+        [(x.time, x.player.name, x.own_goal,
+          [y.name for y in x.assisted_by]) for x in game.goals],
+        [(x.time, x.player.name, x.card_color, x.reason)
+         for x in game.disciplinary_events],
+        [(x.time, x.player_on.name, x.player_off.name) for x in game.subs],
+    )
 
 
 class TestMLSScraper(unittest.TestCase):
@@ -20,7 +80,8 @@ class TestMLSScraper(unittest.TestCase):
         ).read()
         parser.requests = Mock()
         self.parser = parser.MLSStatsParser(
-            'http://www.example.com/stats/', False)
+            'http://www.example.com/stats/', False,
+            transport=parser.requests)
 
     def tearDown(self):
         parser.requests = self.orig_requests
@@ -36,6 +97,7 @@ class TestMLSScraper(unittest.TestCase):
             url=url,
         )
         parser.requests = requests_mock
+        self.parser.transport = requests_mock
 
     def _load_stats(self, players=False):
         self.parser.stat_url = 'http://www.example.com/stats'
@@ -109,8 +171,52 @@ class TestMLSScraper(unittest.TestCase):
     def test_get_team_stats(self):
         self._load_stats()
         self.parser.get_team_stats()
-        assert self.parser.game.home_team.stats
-        assert self.parser.game.away_team.stats
+        home_stats = self.parser.game.home_team.stats
+        away_stats = self.parser.game.away_team.stats
+        self.assertEqual(home_stats.possession, 56.9)
+        self.assertEqual(home_stats.total_passes, 396)
+        self.assertEqual(home_stats.passing_accuracy, 74.0)
+        self.assertEqual(home_stats.other, {})
+        self.assertEqual(
+            home_stats.shots_on_target + home_stats.shots_off_target +
+            home_stats.blocked_shots, home_stats.attempts_on_goal)
+        self.assertEqual(
+            home_stats.possession + away_stats.possession, 100)
+
+    def test_getters_use_stat_index(self):
+        ''' Once the page is loaded, none of the getters should need to
+        search the whole document again
+        '''
+        self._load_stats()
+        self.parser.stat_html.findAll = Mock(
+            side_effect=AssertionError('Full document scan'))
+        self.parser.get_general_info()
+        self.parser.get_team_stats()
+        self.parser.get_players()
+        self.parser.get_events()
+        self.assertEqual(len(self.parser.game.home_team.starters), 10)
+        self.assertEqual(len(self.parser.game.subs), 6)
+        self.assertEqual(self.parser.game.home_team.stats.possession, 56.9)
+        self.assertEqual(
+            self.parser.game.disciplinary_events[0].card_color, 'yellow')
+
+    def test_stat_table_anomalies_logged_once(self):
+        table = BeautifulSoup(
+            '<table><tr><th>#</th><th>Player</th></tr>'
+            '<tr><td>1</td><td>A</td><td>x</td><td>y</td></tr>'
+            '<tr><td>2</td><td>B</td><td>z</td></tr></table>')
+        self.parser.logger = Mock()
+        rows = self.parser._parse_stat_table(table)
+        self.assertEqual(rows, [{'#': 1, 'Player': 'A'},
+                                {'#': 2, 'Player': 'B'}])
+        self.assertEqual(self.parser.metrics.counters['index_errors'], 3)
+        self.assertEqual(self.parser.logger.info.call_count, 1)
+
+    def test_default_logger(self):
+        self.assertEqual(self.parser.logger.name, log.LOGGER_NAME)
+        self.assertEqual(
+            [type(x) for x in self.parser.logger.handlers],
+            [log.QueueHandler])
 
     def test_get_starters(self):
         self._load_stats()
@@ -119,6 +225,11 @@ class TestMLSScraper(unittest.TestCase):
         assert self.parser.game.away_team.players
         self.assertEqual(len(self.parser.game.home_team.players), 10)
         self.assertEqual(len(self.parser.game.away_team.players), 10)
+        starter = self.parser.game.home_team.starters[0]
+        self.assertEqual(starter.name, 'Austin Berry')
+        self.assertEqual(starter.number, 22)
+        self.assertEqual(starter.minutes, 90)
+        self.assertEqual(starter.fouls_suffered, 3)
 
     def test_get_keepers(self):
         self._load_stats()
@@ -243,6 +354,1311 @@ class TestMLSScraper(unittest.TestCase):
             '3-5-2'
         )
 
+    def test_formation_contents(self):
+        ''' Text nested at any depth is gathered in document order '''
+        soup = BeautifulSoup(
+            '<span class="player"><strong>7</strong><b> Sherjill'
+            '<i>MacDonald </i></b><!--x--></span>')
+        self.assertEqual(
+            self.parser._get_formation_contents(soup.span),
+            '7SherjillMacDonaldx')
+        self.assertEqual(
+            self.parser._get_formation_contents(soup.strong.contents[0]), '7')
+        self.assertEqual(parser._formation_name('14Patrick Nyarko'),
+                         'Patrick Nyarko')
+        self.assertEqual(parser._formation_name('12'), '')
+
+    def test_prefetched_formation_is_used(self):
+        ''' The formation page fetched alongside the stats page should be
+        used by get_formations instead of being fetched a second time
+        '''
+        html = open(os.path.join(
+            os.path.dirname(__file__), 'test_formation.html')).read()
+        self.parser.stat_url = 'http://www.example.com/stats'
+        self._create_requests_mock_return(html=html)
+        self.parser._start_prefetch()
+        self.parser._formation_prefetch.result()
+
+        self._load_stats(players=True)
+        parser.requests.get.reset_mock()
+        self.parser.get_formations()
+        assert not parser.requests.get.called
+        self.assertEqual(
+            self.parser.game.home_team.formation.formation,
+            '4-2-3-1'
+        )
+
+    def test_prefetch_ignored_after_redirect(self):
+        ''' A prefetch for a url we no longer point at should be dropped '''
+        html = open(os.path.join(
+            os.path.dirname(__file__), 'test_formation.html')).read()
+        self.parser.stat_url = 'http://www.example.com/old/stats'
+        self._create_requests_mock_return()
+        self.parser._start_prefetch()
+
+        self._load_stats(players=True)
+        self._create_requests_mock_return(html=html)
+        self.parser.get_formations()
+        parser.requests.get.assert_called_once_with(
+            'http://www.example.com/formation', headers=None)
+        self.assertEqual(
+            self.parser.game.away_team.formation.formation,
+            '3-5-2'
+        )
+
+
+class TestTeam(unittest.TestCase):
+
+    def _player(self, first_name, last_name, number):
+        player_obj = Player()
+        player_obj.first_name = first_name
+        player_obj.last_name = last_name
+        player_obj.number = number
+        return player_obj
+
+    def test_get_player(self):
+        team = Team(
+            starters=[self._player('Chris', 'Rolfe', 17)],
+            keepers=[self._player('Sean', 'Johnson', 25)],
+        )
+        self.assertEqual(team.get_player('Sean Johnson').number, 25)
+        self.assertEqual(team.get_player_by_number(17).name, 'Chris Rolfe')
+        self.assertEqual(team.get_player('Nobody Here'), None)
+
+    def test_index_follows_player_changes(self):
+        team = Team(starters=[self._player('Chris', 'Rolfe', 17)])
+        assert team.get_player('Chris Rolfe')
+
+        team.add_sub(self._player('Bench', 'Player', -1))
+        self.assertEqual(team.get_player_by_number(-1).name, 'Bench Player')
+
+        team.subs.append(self._player('Dilly', 'Duka', 11))
+        assert team.get_player('Dilly Duka')
+
+        team.starters = [self._player('Mike', 'Magee', 18)]
+        self.assertEqual(team.get_player('Chris Rolfe'), None)
+        assert team.get_player('Mike Magee')
+
+    def test_team_stats_conversion(self):
+        stats = TeamStats()
+        stats.set_stat('Possession', '43.1%')
+        stats.set_stat('Fouls', '12')
+        stats.set_stat('Red Cards', '-')
+        stats.set_stat('Headers Won', '7')
+        self.assertEqual(stats.possession, 43.1)
+        self.assertEqual(stats.fouls, 12)
+        self.assertEqual(stats.red_cards, None)
+        self.assertEqual(stats.corner_kicks, None)
+        self.assertEqual(stats.other, {'Headers Won': '7'})
+
+    def test_defaults_are_per_instance(self):
+        first, second = GameStatSet(), GameStatSet()
+        first.goals.append(Goal())
+        first.home_team.subs.append(Player())
+        first.goals[0].assisted_by.append(Player())
+        self.assertEqual(second.goals, [])
+        self.assertEqual(second.home_team.subs, [])
+        self.assertEqual(Goal().assisted_by, [])
+        assert not hasattr(Player(), '__dict__')
+
+
+class TestBatchScraping(unittest.TestCase):
+
+    def setUp(self):
+        super(TestBatchScraping, self).setUp()
+        self.server = StubServer()
+        self.server.start()
+        self.transport = Transport()
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.stop()
+        super(TestBatchScraping, self).tearDown()
+
+    def _match_url(self, count):
+        return self.server.url(
+            'matchcenter/2013-03-24-CHI-v-CHV-%s/stats' % count)
+
+    def test_scrape_many(self):
+        ''' Scrapes several matches from the local stub and makes sure every
+        one of them comes back fully parsed
+        '''
+        urls = [self._match_url(x) for x in range(3)]
+        games = list(batch.scrape_many(
+            urls, max_concurrency=3, transport=self.transport))
+        self.assertEqual(len(games), 3)
+        self.assertEqual(sorted(x.stat_url for x in games), sorted(urls))
+        for game in games:
+            self.assertEqual(game.home_team.name, 'Chicago Fire')
+            self.assertEqual(len(game.goals), 5)
+            self.assertEqual(game.away_team.formation.formation, '3-5-2')
+
+        self.assertEqual(len(self.server.requests), 6)
+
+    def test_single_match_fetches_each_page_once(self):
+        game = parser.MLSStatsParser(
+            self._match_url(1), transport=self.transport).game
+        self.assertEqual(game.home_team.formation.formation, '4-2-3-1')
+        self.assertEqual(sorted(self.server.requests), [
+            '/matchcenter/2013-03-24-CHI-v-CHV-1/formation',
+            '/matchcenter/2013-03-24-CHI-v-CHV-1/stats',
+        ])
+
+    def test_iter_stats_yields_each_stage(self):
+        stats_parser = parser.MLSStatsParser(
+            self._match_url(1), False, transport=self.transport)
+        stages = [stage for stage, game in stats_parser.iter_stats()]
+        self.assertEqual(
+            stages, [x for x, method in parser.StatsParser.STAGES])
+        self.assertEqual(
+            stats_parser.game.away_team.formation.formation, '3-5-2')
+
+    def test_iter_stats_stops_early(self):
+        ''' Stopping after the events means the formation page is never
+        fetched
+        '''
+        stats_parser = parser.MLSStatsParser(
+            self._match_url(1), False, transport=self.transport)
+        for stage, game in stats_parser.iter_stats():
+            if stage == 'events':
+                break
+
+        self.assertEqual(len(game.goals), 5)
+        self.assertEqual(game.home_team.formation, None)
+        self.assertEqual(
+            self.server.requests,
+            ['/matchcenter/2013-03-24-CHI-v-CHV-1/stats'])
+
+    def test_sections_load_lazily(self):
+        ''' Only the requested sections (and what they depend on) are ever
+        loaded, and only once the game is read
+        '''
+        game = parser.MLSStatsParser(
+            self._match_url(1), sections=['info', 'goals'],
+            transport=self.transport).game
+        self.assertEqual(self.server.requests, [])
+
+        self.assertEqual(len(game.goals), 5)
+        self.assertEqual(game.goals[1].player.name, 'Patrick Nyarko')
+        self.assertEqual(game.home_team.name, 'Chicago Fire')
+        self.assertEqual(len(game.home_team.starters), 10)
+        self.assertEqual(game.home_team.stats.possession, None)
+        self.assertEqual(game.home_team.formation, None)
+        self.assertEqual(game.disciplinary_events, [])
+        self.assertEqual(
+            self.server.requests,
+            ['/matchcenter/2013-03-24-CHI-v-CHV-1/stats'])
+
+    def test_team_sections_load_with_the_team(self):
+        game = parser.MLSStatsParser(
+            self._match_url(1), sections=['formations', 'team_stats'],
+            transport=self.transport).game
+        self.assertEqual(game.away_team.formation.formation, '3-5-2')
+        self.assertEqual(game.away_team.stats.possession, 43.1)
+        self.assertEqual(game.away_team.name, None)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_unknown_section(self):
+        self.assertRaises(
+            ValueError, parser.MLSStatsParser, self._match_url(1),
+            sections=['score'])
+
+    def test_scrape_many_reports_errors(self):
+        ''' Failing matches are handed to on_error and don't stop the batch '''
+        errors = []
+        urls = [self._match_url(1), self.server.url('matchcenter/missing')]
+        games = list(batch.scrape_many(
+            urls, on_error=lambda url, exc: errors.append(url),
+            transport=self.transport))
+        self.assertEqual(len(games), 1)
+        self.assertEqual(errors, [urls[1]])
+
+    def test_scrape_many_keeps_worker_traceback(self):
+        ''' Without on_error the failure is raised with the traceback from
+        the worker thread, not just the batch's
+        '''
+        urls = [self.server.url('matchcenter/missing')]
+        try:
+            list(batch.scrape_many(urls, transport=self.transport))
+        except requests.RequestException:
+            frames = traceback.extract_tb(sys.exc_info()[2])
+        else:
+            self.fail('No exception raised')
+        assert 'parser.py' in [os.path.basename(x[0]) for x in frames]
+
+
+class TestParseMetrics(unittest.TestCase):
+
+    def test_stages_are_timed(self):
+        with StubServer() as server, Transport() as transport:
+            game = parser.MLSStatsParser(
+                server.url('matchcenter/2013-03-24-CHI-v-CHV/stats'),
+                transport=transport).game
+        metrics = game.metrics
+        stages = [x for x, method in parser.StatsParser.STAGES]
+        for stage in stages + ['load_stats', 'fetch', 'parse_stats_html',
+                               'index_stats_html', 'parse_formation_html']:
+            self.assertEqual(
+                metrics.calls[stage], 2 if stage == 'fetch' else 1)
+            assert metrics.timings[stage] >= 0
+        self.assertEqual(
+            metrics.counters['bytes_downloaded'],
+            len(load_fixture('test_stats.html')) +
+            len(load_fixture('test_formation.html')))
+        self.assertEqual(metrics.counters['rows_parsed'], 37)
+        assert 'index_errors' not in metrics.counters
+
+    def test_merge_and_export(self):
+        now = [100.0]
+        metrics = ParseMetrics(clock=lambda: now[0])
+        with metrics.time('fetch'):
+            now[0] += 0.25
+        metrics.count('rows_parsed', 10)
+
+        other = ParseMetrics()
+        other.add_time('fetch', 0.5)
+        other.count('rows_parsed', 5)
+        other.count('recap_redirects')
+
+        total = reduce(ParseMetrics.merge, [metrics, other], ParseMetrics())
+        self.assertEqual(total.timings, {'fetch': 0.75})
+        self.assertEqual(total.calls, {'fetch': 2})
+        self.assertEqual(
+            total.counters, {'rows_parsed': 15, 'recap_redirects': 1})
+        self.assertEqual(total.to_prometheus().splitlines(), [
+            '# TYPE mls_scraper_stage_seconds_total counter',
+            'mls_scraper_stage_seconds_total{stage="fetch"} 0.75',
+            '# TYPE mls_scraper_stage_calls_total counter',
+            'mls_scraper_stage_calls_total{stage="fetch"} 2',
+            '# TYPE mls_scraper_recap_redirects_total counter',
+            'mls_scraper_recap_redirects_total 1',
+            '# TYPE mls_scraper_rows_parsed_total counter',
+            'mls_scraper_rows_parsed_total 15',
+        ])
+
+
+def _log_in_worker(message):
+    log.get_default_logger().warning(message)
+    return os.getpid()
+
+
+class TestLogging(unittest.TestCase):
+
+    def test_queued_logging(self):
+        records = []
+        capture = logging.Handler()
+        capture.emit = records.append
+        queue = Queue.Queue()
+        listener = log.QueueListener(queue, capture)
+        logger = logging.getLogger('mls_scraper.tests.queued')
+        logger.propagate = False
+        logger.addHandler(log.QueueHandler(queue))
+
+        listener.start()
+        for count in range(3):
+            logger.warning('Row %s', count)
+        listener.stop()
+        self.assertEqual(
+            [x.getMessage() for x in records], ['Row 0', 'Row 1', 'Row 2'])
+
+    def test_default_logger_in_worker_processes(self):
+        ''' Workers forked after the logger was set up get a listener of
+        their own, and their records make it to the log file
+        '''
+        log.get_default_logger()
+        message = 'Logged from a worker %s' % time.time()
+        pool = multiprocessing.Pool(1)
+        worker_pid, = pool.map(_log_in_worker, [message])
+        pool.close()
+        pool.join()
+        self.assertNotEqual(worker_pid, os.getpid())
+        with open(log._default_settings[1]) as log_file:
+            assert message in log_file.read()
+
+    def test_repeat_filter(self):
+        now = [0]
+        repeat_filter = log.RepeatFilter(
+            limit=2, interval=60, clock=lambda: now[0])
+
+        def record(msg):
+            return logging.LogRecord(
+                'mls_scraper', logging.INFO, __file__, 1, msg, (), None)
+
+        self.assertEqual(
+            [repeat_filter.filter(record('Bad row %s')) for x in range(4)],
+            [True, True, False, False])
+        assert repeat_filter.filter(record('Something else'))
+
+        now[0] = 60
+        passed = record('Bad row %s')
+        assert repeat_filter.filter(passed)
+        self.assertEqual(passed.msg, 'Bad row %s (2 more like this dropped)')
+        assert repeat_filter.filter(record('Bad row %s'))
+        assert not repeat_filter.filter(record('Bad row %s'))
+
+        error = logging.LogRecord(
+            'mls_scraper', logging.ERROR, __file__, 1, 'Unable to load URL',
+            (), None)
+        assert all(repeat_filter.filter(error) for x in range(5))
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_scale_page(self):
+        game = parser.SavedPageParser.from_html(benchmark.scale_page(
+            load_fixture('test_stats.html'), 3)).game
+        self.assertEqual(len(game.goals), 15)
+        self.assertEqual(len(game.home_team.starters), 30)
+
+    def test_run_benchmarks(self):
+        results = benchmark.run_benchmarks(
+            scales=(1, 2), repeat=1, backend='lxml', partial=True)
+        self.assertEqual(sorted(results['results']), ['scale=1', 'scale=2'])
+        timings = results['results']['scale=2']
+        self.assertEqual(timings['generate_stats']['runs'], 1)
+        assert 'parse_formation_html' in timings
+        self.assertEqual(results['meta']['backend'], 'lxml')
+
+        baseline = json.loads(json.dumps(results))
+        self.assertEqual(benchmark.compare(baseline, results), [])
+        baseline['results']['scale=2']['get_players']['median'] /= 2
+        self.assertEqual(
+            [x[:2] for x in benchmark.compare(baseline, results)],
+            [('scale=2', 'get_players')])
+
+
+class TestParseSaved(unittest.TestCase):
+
+    def setUp(self):
+        super(TestParseSaved, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        fixture_dir = os.path.dirname(__file__)
+        for name in ('test_stats.html', 'test_formation.html'):
+            shutil.copy(os.path.join(fixture_dir, name), self.tmp_dir)
+        for match in ('2013/101', '2013/102'):
+            match_dir = os.path.join(self.tmp_dir, match)
+            os.makedirs(match_dir)
+            shutil.copy(os.path.join(fixture_dir, 'test_stats.html'),
+                        os.path.join(match_dir, 'stats.html'))
+        shutil.copy(os.path.join(fixture_dir, 'test_formation.html'),
+                    os.path.join(self.tmp_dir, '2013/101/formation.html'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(TestParseSaved, self).tearDown()
+
+    def test_find_saved_pages(self):
+        self.assertEqual(
+            [(x, os.path.relpath(y, self.tmp_dir), z and os.path.basename(z))
+             for x, y, z in batch.find_saved_pages(self.tmp_dir)],
+            [('2013/101', '2013/101/stats.html', 'formation.html'),
+             ('2013/102', '2013/102/stats.html', None),
+             ('test', 'test_stats.html', 'test_formation.html')])
+
+    def test_saved_page_parser(self):
+        stats_parser = parser.SavedPageParser(
+            os.path.join(self.tmp_dir, 'test_stats.html'),
+            os.path.join(self.tmp_dir, 'test_formation.html'),
+            transport=Mock(**{'get.side_effect': AssertionError('Fetched')}))
+        with StubServer() as server, Transport() as transport:
+            game = parser.MLSStatsParser(server.url(
+                'matchcenter/2013-03-24-CHI-v-CHV/stats'),
+                transport=transport).game
+        self.assertEqual(
+            summarize_game(stats_parser.game), summarize_game(game))
+
+    def test_parse_from_html_and_files(self):
+        stats_path = os.path.join(self.tmp_dir, 'test_stats.html')
+        formation_path = os.path.join(self.tmp_dir, 'test_formation.html')
+        from_paths = parser.SavedPageParser(stats_path, formation_path).game
+        self.assertEqual(from_paths.stat_url, stats_path)
+
+        with open(stats_path, 'rb') as stats:
+            with open(formation_path, 'rb') as formation:
+                from_files = parser.SavedPageParser(
+                    stats, formation, backend='lxml').game
+        self.assertEqual(from_files.stat_url, stats_path)
+        self.assertEqual(
+            summarize_game(from_files), summarize_game(from_paths))
+
+        from_html = parser.SavedPageParser.from_html(
+            load_fixture('test_stats.html'),
+            load_fixture('test_formation.html'), stat_url='http://x/stats',
+            sections=['goals']).game
+        self.assertEqual(from_html.stat_url, 'http://x/stats')
+        self.assertEqual(len(from_html.goals), 5)
+
+    def test_parse_saved(self):
+        results = dict(batch.parse_saved(self.tmp_dir, processes=2))
+        self.assertEqual(sorted(results), ['2013/101', '2013/102', 'test'])
+        self.assertEqual(
+            summarize_game(results['2013/101']),
+            summarize_game(results['test']))
+        self.assertEqual(results['2013/102'].home_team.formation, None)
+        self.assertEqual(len(results['test'].goals), 5)
+        self.assertEqual(len(results['test'].home_team.formation.players), 5)
+        self.assertEqual(
+            results['test'].metrics.calls['parse_formation_html'], 1)
+
+    def test_parse_saved_reports_errors(self):
+        with open(os.path.join(self.tmp_dir, 'broken_stats.html'), 'w') as f:
+            f.write('<html></html>')
+
+        errors = []
+        results = list(batch.parse_saved(
+            self.tmp_dir, processes=2, chunksize=1, decode=False,
+            on_error=lambda *args: errors.append(args)))
+        self.assertEqual(len(results), 3)
+        assert all(isinstance(data, str) for match_id, data in results)
+        self.assertEqual([x for x, exc in errors], ['broken'])
+        assert 'parser.py' in errors[0][1].traceback
+
+
+class TestDiscovery(unittest.TestCase):
+
+    SCHEDULE = (
+        '<a href="/matchcenter/2013-03-24-CHI-v-CHV/stats">Stats</a>'
+        '<a href="/matchcenter/2013-03-30-MON-v-KC/recap">Recap</a>'
+        '<a href=\'/matchcenter/2013-03-30-MTL-v-SKC/boxscore\'>Box</a>'
+        '<a href="/matchcenter/2013-02-02-NY-v-DC/stats">Preseason</a>'
+        '<a href="/matchcenter/2013-04-06-XYZ-v-DC/stats">Unknown</a>'
+        '<a href="/results">Results</a>'
+        '<a href="/about">About</a>'
+    )
+    RESULTS = (
+        '<a href="http://example.com/matchcenter/2013-04-06-POR-v-SEA">'
+        'Absolute</a>'
+        '<a href="/matchcenter/2013-03-24-CHI-v-CHV/recap">Again</a>'
+        '<a href="/schedule">Schedule</a>'
+    )
+
+    def test_match_keys(self):
+        self.assertEqual(
+            discovery.match_key('/matchcenter/2013-03-30-MON-v-KC/recap'),
+            discovery.match_key(
+                'http://x/matchcenter/2013-03-30-MTL-v-SKC/stats'))
+        self.assertEqual(discovery.match_key('/matchcenter/'), None)
+        self.assertEqual(
+            discovery.stats_url('http://x/matchcenter/2013-03-30-MON-v-KC'),
+            'http://x/matchcenter/2013-03-30-MON-v-KC/stats')
+
+    def test_candidate_urls(self):
+        urls = list(discovery.candidate_urls(
+            date(2013, 3, 2), date(2013, 3, 4), ['MON', 'MTL', 'KC', 'CHI']))
+        self.assertEqual(len(urls), 12)
+        self.assertEqual(len(set(discovery.match_key(x) for x in urls)), 12)
+        self.assertEqual(
+            urls[0], 'http://www.mlssoccer.com/matchcenter/2013-03-02-CHI-v-'
+                     'MTL/stats')
+        self.assertRaises(ValueError, discovery.club_code, 'XYZ')
+
+    def test_frontier(self):
+        frontier = discovery.MatchFrontier()
+        guesses = discovery.candidate_urls(
+            date(2013, 3, 29), date(2013, 3, 31), ['MTL', 'SKC'])
+        self.assertEqual(
+            [frontier.add(x, confirmed=False) for x in guesses],
+            [True] * 4)
+        assert frontier.add('/matchcenter/2013-04-06-POR-v-SEA/recap')
+        # A link to a guessed match replaces the guess, and jumps the queue
+        assert frontier.add('http://y/matchcenter/2013-03-30-MON-v-KC/stats')
+        assert not frontier.add('/matchcenter/2013-03-30-MTL-v-SKC')
+        self.assertEqual(len(frontier), 5)
+
+        self.assertEqual(frontier.pop(), 'http://y/matchcenter/'
+                                         '2013-03-30-MON-v-KC/stats')
+        self.assertEqual(frontier.pop(), '/matchcenter/'
+                                         '2013-04-06-POR-v-SEA/stats')
+        self.assertEqual(len(list(frontier)), 3)
+        assert not frontier.add('/matchcenter/2013-04-06-PTI-v-SEA/stats')
+        self.assertRaises(IndexError, frontier.pop)
+
+    def test_crawl(self):
+        pages = {'schedule': self.SCHEDULE, 'results': self.RESULTS}
+        with StubServer(pages) as server, Transport() as transport:
+            crawler = discovery.MatchCrawler(
+                start=date(2013, 3, 1), end=date(2013, 5, 1),
+                follow=r'/(results|schedule)$', transport=transport)
+            frontier = crawler.crawl([server.url('schedule')])
+            base_url = server.base_url
+
+        self.assertEqual(server.requests, ['/schedule', '/results'])
+        self.assertEqual(list(frontier), [
+            base_url + '/matchcenter/2013-03-24-CHI-v-CHV/stats',
+            base_url + '/matchcenter/2013-03-30-MON-v-KC/stats',
+            'http://example.com/matchcenter/2013-04-06-POR-v-SEA/stats',
+        ])
+        self.assertEqual(
+            crawler.counters, {'pages': 2, 'links': 6, 'queued': 3})
+
+
+class TestCommandLine(unittest.TestCase):
+
+    def setUp(self):
+        super(TestCommandLine, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(TestCommandLine, self).tearDown()
+
+    def _run(self, argv, stdin=''):
+        stdout, stderr = StringIO(), StringIO()
+        status = cli.main(argv, StringIO(stdin), stdout, stderr)
+        return status, stdout.getvalue(), stderr.getvalue()
+
+    def test_scrape_to_ndjson(self):
+        url_file = os.path.join(self.tmp_dir, 'urls.txt')
+        with StubServer() as server:
+            urls = [server.url('matchcenter/2013-03-24-CHI-v-CHV/stats'),
+                    server.url('matchcenter/2013-03-24-CHI-v-CHV/recap'),
+                    server.url('matchcenter/2013-04-24-CHI-v-CHV/stats')]
+            with open(url_file, 'w') as out:
+                out.write('# one match, twice\n%s\n%s\n' % tuple(urls[1:]))
+            status, stdout, stderr = self._run(
+                [urls[0], '-f', url_file, '--end', '2013-04-01', '-w', '2'])
+        self.assertEqual(status, 0)
+        lines = stdout.splitlines()
+        self.assertEqual(len(lines), 1)
+        game = json.loads(lines[0])
+        self.assertEqual(game['stat_url'], urls[0])
+        self.assertEqual(game['home_team']['name'], 'Chicago Fire')
+        self.assertEqual(game['home_team']['formation']['formation'],
+                         '4-2-3-1')
+        self.assertEqual(len(game['goals']), 5)
+        assert stderr.startswith('1 matches scraped, 0 failed in ')
+        assert 'latency: p50 ' in stderr
+
+    def test_failures_and_store(self):
+        store_path = os.path.join(self.tmp_dir, 'season.npz')
+        with StubServer() as server:
+            urls = [server.url('matchcenter/2013-03-24-CHI-v-CHV/stats'),
+                    server.url('matchcenter/missing')]
+            status, stdout, stderr = self._run(
+                ['-f', '-', '-o', '', '--store', store_path],
+                stdin='\n'.join(urls))
+        self.assertEqual(status, 1)
+        self.assertEqual(stdout, '')
+        assert 'Failed to scrape %s' % urls[1] in stderr
+        assert '1 matches scraped, 1 failed in ' in stderr
+        self.assertEqual(len(season.SeasonStore.load(store_path).matches), 1)
+
+    def test_pool_fits_workers(self):
+        with patch.object(cli, 'Transport', wraps=Transport) as transport:
+            status, stdout, stderr = self._run(['-w', '16', '-o', '', 'x'])
+        transport.assert_called_once_with(min_interval=0, pool_size=32)
+
+    @unittest.skipIf(backends.etree is None, 'lxml is not installed')
+    def test_backend(self):
+        with StubServer() as server:
+            status, stdout, stderr = self._run(
+                ['--backend', 'lxml',
+                 server.url('matchcenter/2013-03-24-CHI-v-CHV/stats')])
+        self.assertEqual(status, 0)
+        game = json.loads(stdout)
+        self.assertEqual(game['home_team']['name'], 'Chicago Fire')
+        self.assertEqual(len(game['goals']), 5)
+
+    def test_unknown_backend(self):
+        stderr, sys.stderr = sys.stderr, StringIO()
+        try:
+            with self.assertRaises(SystemExit):
+                self._run(['--backend', 'bs'])
+            assert "invalid choice: 'bs'" in sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+
+    def test_club_needs_dates(self):
+        status, stdout, stderr = self._run(['--club', 'CHI', '--club', 'CLB'])
+        self.assertEqual(status, 2)
+        self.assertEqual(stderr, '--club needs --start and --end\n')
+
+    def test_date_range_tries_every_club(self):
+        args = cli._build_arg_parser().parse_args(
+            ['--start', '2013-03-24', '--end', '2013-03-25'])
+        urls = cli.find_urls(args, None)
+        self.assertEqual(sorted(urls), sorted(discovery.candidate_urls(
+            date(2013, 3, 24), date(2013, 3, 25))))
+        assert ('http://www.mlssoccer.com/matchcenter/'
+                '2013-03-24-CHI-v-CLB/stats') in urls
+
+    def test_nothing_to_scrape(self):
+        status, stdout, stderr = self._run(['--start', '2013-03-24'])
+        self.assertEqual(status, 2)
+        self.assertEqual(
+            stderr, 'give urls, --url-file, --crawl, or --start and --end\n')
+
+
+class TestBackfillJob(unittest.TestCase):
+
+    def setUp(self):
+        super(TestBackfillJob, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'backfill.db')
+        self.server = StubServer()
+        self.server.start()
+        self.urls = [
+            self.server.url('matchcenter/2013-03-24-CHI-v-CHV-%s/stats' % x)
+            for x in range(3)]
+        self.missing = self.server.url('matchcenter/2013-03-24-X-v-Y/nope')
+        self.transport = Transport()
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.stop()
+        shutil.rmtree(self.tmp_dir)
+        super(TestBackfillJob, self).tearDown()
+
+    def _job(self, **kwargs):
+        kwargs.setdefault('transport', self.transport)
+        return BackfillJob(self.path, max_attempts=2, batch_size=2, **kwargs)
+
+    def test_run_and_resume(self):
+        with self._job() as job:
+            self.assertEqual(job.add(self.urls + [self.missing]), 4)
+            self.assertEqual(job.add(self.urls[:1]), 0)
+            self.assertEqual(
+                job.run(max_concurrency=2),
+                {'pending': 0, 'fetched': 0, 'parsed': 3, 'failed': 1})
+            self.assertEqual(job.counters['commits'], 2)
+            [(url, attempts, error)] = job.failures()
+            self.assertEqual((url, attempts), (self.missing, 1))
+            assert '404' in error
+            games = list(job.games())
+
+        self.assertEqual([x for x, game in games], self.urls)
+        self.assertEqual(summarize_game(games[0][1]),
+                         summarize_game(games[2][1]))
+
+        # Only the failure is tried again, until it's out of attempts
+        del self.server.requests[:]
+        with self._job() as job:
+            job.run()
+            self.assertEqual(
+                self.server.requests, ['/matchcenter/2013-03-24-X-v-Y/nope'])
+            self.assertEqual(job.failures()[0][1], 2)
+            job.run()
+            self.assertEqual(len(self.server.requests), 1)
+
+            job.retry_failed()
+            self.server.pages['nope'] = 'not a stats page'
+            job.run()
+            self.assertEqual(job.failures()[0][1], 1)
+
+    def test_fetch_then_parse_offline(self):
+        with self._job() as job:
+            job.add(self.urls)
+            self.assertEqual(job.run(fetch_only=True)['fetched'], 3)
+            self.assertEqual(job.counters['fetched'], 3)
+
+        self.server.stop()
+        with self._job(transport=Mock(**{
+                'get.side_effect': AssertionError('Fetched')})) as job:
+            # The saved pages are loaded a batch at a time
+            load_tasks = job._load_tasks
+            batches = []
+            job._load_tasks = lambda urls, fetch_only: batches.append(
+                urls) or load_tasks(urls, fetch_only)
+            job.batch_size = 1
+            self.assertEqual(job.run(limit=2)['parsed'], 2)
+            self.assertEqual(batches, [self.urls[:1], self.urls[1:2]])
+            self.assertEqual(job.counters['commits'], 2)
+            self.assertEqual(job.run()['parsed'], 3)
+            self.assertEqual(job.counters['fetched'], 0)
+            self.assertEqual(len(list(job.games())[1][1].goals), 5)
+
+
+class TestPlayerRegistry(unittest.TestCase):
+
+    def test_normalize_name(self):
+        self.assertEqual(normalize_name(u'Edgar Mej\xeda'), u'edgar mejia')
+        self.assertEqual(normalize_name('Edgar Mej\xc3\xada'), u'edgar mejia')
+        self.assertEqual(
+            normalize_name(u' Jalil  Anibaba (OG)'), u'jalil anibaba')
+        self.assertEqual(
+            normalize_name(u"Jean-Marc O'Neil"), u'jean marc o neil')
+        self.assertEqual(
+            normalize_name(u'Ruud van der Berg'), u'ruud van der berg')
+
+    def test_player_ids(self):
+        registry = PlayerRegistry()
+        self.assertEqual(registry.player_id(u'Edgar Mej\xeda'), 0)
+        self.assertEqual(registry.player_id(u'Juan Agudelo'), 1)
+        self.assertEqual(registry.player_id(u'EDGAR MEJIA'), 0)
+        self.assertEqual(registry.lookup(u'Edgar Mejia'), 0)
+        self.assertEqual(registry.lookup(u'Ed Mejia'), None)
+        registry.alias(u'Ed Mejia', u'Edgar Mejia')
+        self.assertEqual(registry.canonical_name(u'Ed Mejia'),
+                         u'Edgar Mej\xeda')
+        self.assertEqual(len(registry), 2)
+
+        game = parser.SavedPageParser.from_html(
+            load_fixture('test_stats.html')).game
+        ids = registry.add_game(game)
+        self.assertEqual(ids[id(game.goals[0].player)], 0)
+        self.assertEqual(len(registry), len(set(ids.values())))
+
+    def test_whole_names_are_registered(self):
+        ''' Players are registered under their whole name, not the two
+        words `name` keeps
+        '''
+        stats = {'#': 9, 'MIN': 90, 'FC': 0, 'FS': 0, 'G': 0, 'SOG': 0,
+                 'CK': 0, 'OFF': 0}
+        angel = Player(dict(stats, Player=u'Juan Pablo Angel'))
+        pineda = Player(dict(stats, Player=u'Juan Pablo Pineda'))
+        self.assertEqual(angel.name, pineda.name)
+        registry = PlayerRegistry()
+        self.assertEqual(
+            [registry.add_player(x) for x in (angel, pineda, Player())],
+            [0, 1, 2])
+        self.assertEqual(registry.names[:2],
+                         [u'Juan Pablo Angel', u'Juan Pablo Pineda'])
+
+    def test_booked_bench_players_keep_whole_names(self):
+        registry = PlayerRegistry()
+        ids = []
+        for name in (u'Juan Pablo Angel', u'Juan Pablo Pineda'):
+            # One match each, as the two-word name is what get_player finds
+            stats_parser = parser.SavedPageParser.from_html(
+                load_fixture('test_stats.html'))
+            stats_parser.game
+            booking = stats_parser._parse_booking_dict({
+                'Club': 'CHV', 'Time': "90'", 'Player': name,
+                'Reason': 'Dissent', 'card_color': 'yellow'})
+            self.assertEqual(booking.player.name, u'Juan Pablo')
+            ids.append(registry.add_player(booking.player))
+        self.assertEqual(ids, [0, 1])
+        self.assertEqual(registry.names,
+                         [u'Juan Pablo Angel', u'Juan Pablo Pineda'])
+
+    def test_memoized_names(self):
+        self.assertEqual(full_name(u'Jalil Anibaba (OG)'), u'Jalil Anibaba')
+        assert Player.parse_name(u'Jalil Anibaba') is \
+            Player.parse_name(u'Jalil Anibaba')
+        assert full_name(u'Juan Agudelo') is full_name(u'Juan Agudelo')
+
+    def test_memo_is_bounded(self):
+        calls = []
+
+        @memoize(maxsize=2)
+        def shout(text):
+            calls.append(text)
+            return text.upper()
+
+        self.assertEqual([shout(x) for x in 'aab'], ['A', 'A', 'B'])
+        self.assertEqual(calls, ['a', 'b'])
+        shout('c')
+        self.assertEqual(len(shout.memo), 1)
+        shout.clear()
+        shout('c')
+        self.assertEqual(calls, ['a', 'b', 'c', 'c'])
+
+
+class TestLiveTracker(unittest.TestCase):
+
+    OWN_GOAL_ROW = (
+        "<tr class=\"odd\"><td>CHI</td><td>89'</td>"
+        "<td>Jalil Anibaba (OG)</td><td></td> </tr>")
+
+    def setUp(self):
+        super(TestLiveTracker, self).setUp()
+        self.stats = load_fixture('test_stats.html')
+        self.server = StubServer()
+        self.before_goal = self.stats.replace(self.OWN_GOAL_ROW, '')
+        self.server.pages['stats'] = self.before_goal
+        self.server.start()
+        self.events = []
+        self.transport = Transport()
+        self.tracker = LiveTracker(
+            self.server.url('matchcenter/2013-03-24-CHI-v-CHV/stats'),
+            self.events.append, sleep=Mock(), transport=self.transport)
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.stop()
+        super(TestLiveTracker, self).tearDown()
+
+    def _events_of(self, event_class):
+        return [x for x in self.events if isinstance(x, event_class)]
+
+    def test_first_poll_reports_everything(self):
+        self.tracker.poll()
+        self.assertEqual(len(self._events_of(Goal)), 4)
+        self.assertEqual(len(self._events_of(events.Booking)), 4)
+        self.assertEqual(len(self._events_of(events.Substitution)), 6)
+        possession = [x for x in self._events_of(StatChange)
+                      if x.stat == 'possession']
+        self.assertEqual(
+            [(x.team.name, x.old, x.new) for x in possession],
+            [('Chicago Fire', None, 56.9), ('Chivas USA', None, 43.1)])
+
+    def test_unchanged_page_is_not_parsed(self):
+        self.tracker.run(polls=3)
+        self.assertEqual(self.tracker._sleep.call_count, 2)
+        self.assertEqual(self.tracker.counters['unchanged'], 2)
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(self._events_of(Goal)), 4)
+
+    def test_polls_are_fetched_through_the_parser(self):
+        ''' Polls show up in the game's metrics, and go through a response
+        cache when the tracker is given one
+        '''
+        self.tracker.run(polls=2)
+        metrics = self.tracker.game.metrics
+        self.assertEqual(metrics.calls['fetch'], 2)
+        self.assertEqual(
+            metrics.counters['bytes_downloaded'], len(self.before_goal))
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            cache = ResponseCache(os.path.join(tmp_dir, 'cache.db'))
+            tracker = LiveTracker(
+                self.tracker.parser.stat_url, self.events.append,
+                sleep=Mock(), transport=self.transport, cache=cache)
+            tracker.run(polls=2)
+            cache.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+        self.assertEqual(tracker.counters['unchanged'], 1)
+        self.assertEqual(cache.counters['hits'], 1)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_parse_failures_are_retried(self):
+        ''' A pre-match page without its goals yet fails to parse; the
+        poll is logged and the page read in full once it's all there
+        '''
+        self.server.pages['stats'] = self.before_goal.replace(
+            'id="goals"', 'id="no-goals"')
+        logger = Mock()
+        self.tracker.parser.logger = logger
+        self.tracker.run(polls=2)
+        self.assertEqual(logger.exception.call_count, 2)
+        self.assertEqual(self.events, [])
+
+        self.server.pages['stats'] = self.stats
+        self.tracker.run(polls=1)
+        self.assertEqual(len(self._events_of(Goal)), 5)
+        self.assertEqual(len(self._events_of(events.Substitution)), 6)
+        self.assertEqual(len(self._events_of(events.Booking)), 4)
+
+    def test_only_changes_are_reported(self):
+        self.tracker.poll()
+        parsed = self.tracker.counters['sections_parsed']
+        del self.events[:]
+
+        self.server.pages['stats'] = self.before_goal.replace(
+            '56.9%', '57.2%').replace('43.1%', '42.8%')
+        self.tracker.poll()
+        self.assertEqual(
+            [(x.stat, x.old, x.new) for x in self.events],
+            [('possession', 56.9, 57.2), ('possession', 43.1, 42.8)])
+        self.assertEqual(
+            self.tracker.counters['sections_parsed'], parsed + 1)
+
+        del self.events[:]
+        self.server.pages['stats'] = self.stats
+        self.tracker.poll()
+        goals = self._events_of(Goal)
+        self.assertEqual(len(goals), 1)
+        self.assertEqual(goals[0].player.name, 'Jalil Anibaba')
+        assert goals[0].own_goal
+        self.assertEqual(len(self.tracker.game.goals), 5)
+
+
+class TestTransport(unittest.TestCase):
+
+    def setUp(self):
+        super(TestTransport, self).setUp()
+        self.sleeps = []
+        self.session = Mock()
+
+    def _transport(self, **kwargs):
+        return Transport(
+            session=self.session, sleep=self.sleeps.append, **kwargs)
+
+    def test_retries_server_errors_with_backoff(self):
+        self.session.get.side_effect = [
+            Mock(status_code=503), Mock(status_code=500),
+            Mock(status_code=200)]
+        resp = self._transport(backoff_factor=1).get('http://example.com/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.sleeps, [1, 2])
+
+    def test_returns_last_response_when_retries_run_out(self):
+        self.session.get.return_value = Mock(status_code=502)
+        resp = self._transport(retries=2).get('http://example.com/')
+        self.assertEqual(resp.status_code, 502)
+        self.assertEqual(self.session.get.call_count, 3)
+
+    def test_does_not_retry_client_errors(self):
+        self.session.get.return_value = Mock(status_code=404)
+        self._transport().get('http://example.com/')
+        self.assertEqual(self.session.get.call_count, 1)
+
+    def test_reraises_connection_errors_when_retries_run_out(self):
+        self.session.get.side_effect = requests.ConnectionError()
+        transport = self._transport(retries=1, max_backoff=0.1)
+        self.assertRaises(
+            requests.ConnectionError, transport.get, 'http://example.com/')
+        self.assertEqual(self.sleeps, [0.1])
+
+    def test_rate_limiter_spaces_requests_per_host(self):
+        limiter = RateLimiter(2, clock=lambda: 100, sleep=self.sleeps.append)
+        limiter.wait('a.com')
+        limiter.wait('a.com')
+        limiter.wait('b.com')
+        limiter.wait('a.com')
+        self.assertEqual(self.sleeps, [2, 4])
+
+    def test_parser_reuses_connections_and_survives_blips(self):
+        with StubServer() as server:
+            server.fail('stats', count=2)
+            transport = Transport(sleep=lambda x: None)
+            url = server.url('matchcenter/2013-03-24-CHI-v-CHV/stats')
+            parser_obj = parser.MLSStatsParser(url, transport=transport)
+            self.assertEqual(parser_obj.game.home_team.name, 'Chicago Fire')
+            transport.close()
+            self.assertEqual(len(server.requests), 4)
+            self.assertTrue(server.connections < len(server.requests))
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        super(TestResponseCache, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.now = time.time()
+        self.cache = ResponseCache(
+            os.path.join(self.tmp_dir, 'cache.db'), clock=lambda: self.now)
+        self.server = StubServer()
+        self.server.start()
+        self.transport = Transport()
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.stop()
+        self.cache.close()
+        shutil.rmtree(self.tmp_dir)
+        super(TestResponseCache, self).tearDown()
+
+    def test_finished_matches_are_served_from_cache(self):
+        url = self.server.url('matchcenter/2013-03-24-CHI-v-CHV/stats')
+        first = self.cache.fetch(url, self.transport)
+        self.now += 60 * 60 * 24 * 365
+        second = self.cache.fetch(url, self.transport)
+        self.assertEqual(first.content, second.content)
+        assert second.from_cache
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.cache.counters['hits'], 1)
+        self.assertEqual(self.cache.counters['misses'], 1)
+
+    def test_live_matches_are_revalidated(self):
+        today = time.strftime('%Y-%m-%d', time.localtime(self.now))
+        url = self.server.url('matchcenter/%s-CHI-v-CHV/stats' % today)
+        self.cache.fetch(url, self.transport)
+        self.cache.fetch(url, self.transport)
+        self.assertEqual(len(self.server.requests), 1)
+
+        self.now += self.cache.live_ttl + 1
+        resp = self.cache.fetch(url, self.transport)
+        assert resp.from_cache
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.cache.counters['revalidated'], 1)
+
+    def test_redirected_responses_are_not_stored(self):
+        url = 'http://example.com/matchcenter/2013-03-24-CHI-v-CHV/stats'
+        recap_url = url.replace('stats', 'recap')
+        transport = Mock(**{
+            'get.return_value': CachedResponse(recap_url, 'recap')})
+        self.cache.fetch(url, transport)
+        resp = self.cache.fetch(url, transport)
+        self.assertEqual(resp.url, recap_url)
+        self.assertEqual(transport.get.call_count, 2)
+        self.assertEqual(self.cache.counters['stores'], 0)
+        self.assertEqual(self.cache.get(recap_url), None)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.cache.max_size = 10
+        for page in ('a', 'b'):
+            self.cache.store(CachedResponse(page, '12345'))
+            self.now += 1
+        self.cache.get('a')
+        self.now += 1
+        self.cache.store(CachedResponse('c', '12345'))
+        self.assertEqual(self.cache.get('b'), None)
+        assert self.cache.get('a')
+        assert self.cache.get('c')
+        self.assertEqual(self.cache.counters['evictions'], 1)
+
+    def test_parser_reads_through_cache(self):
+        url = self.server.url('matchcenter/2013-03-24-CHI-v-CHV/stats')
+        parser.MLSStatsParser(
+            url, cache=self.cache, transport=self.transport)
+        game = parser.MLSStatsParser(
+            url, cache=self.cache, transport=self.transport).game
+        self.assertEqual(game.home_team.formation.formation, '4-2-3-1')
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.cache.counters['hits'], 2)
+
+
+class TestHTMLBackends(unittest.TestCase):
+
+    def setUp(self):
+        super(TestHTMLBackends, self).setUp()
+        self.server = StubServer()
+        self.server.start()
+        self.url = self.server.url('matchcenter/2013-03-24-CHI-v-CHV/stats')
+        self.transport = Transport()
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.stop()
+        super(TestHTMLBackends, self).tearDown()
+
+    @unittest.skipIf(backends.etree is None, 'lxml is not installed')
+    def test_lxml_matches_beautifulsoup(self):
+        ''' Both backends should produce exactly the same GameStatSet for the
+        bundled fixtures
+        '''
+        expected = parser.MLSStatsParser(
+            self.url, backend='beautifulsoup', transport=self.transport).game
+        game = parser.MLSStatsParser(
+            self.url, backend='lxml', transport=self.transport).game
+        self.assertEqual(summarize_game(game), summarize_game(expected))
+        self.assertEqual(game.away_team.formation.formation, '3-5-2')
+
+    @unittest.skipIf(backends.etree is None, 'lxml is not installed')
+    def test_lxml_tree_is_navigable(self):
+        soup = backends.get_backend('lxml').parse(
+            '<table id="t"><tr><td> a </td><td>b</td></tr></table>')
+        table = soup.find('table', {'id': 't'})
+        self.assertEqual(table.text, 'ab')
+        self.assertEqual(table.findNext('td').findNextSibling().text, 'b')
+
+    @unittest.skipIf(backends.etree is None, 'lxml is not installed')
+    def test_lxml_decodes_like_beautifulsoup(self):
+        ''' Pages without a declared charset are read as utf-8, not
+        latin-1, and a declared charset is honoured
+        '''
+        pages = [
+            '<div class="home-team-title">Edgar Mej\xc3\xada</div>',
+            '<html><head><meta http-equiv="Content-Type" content="text/html;'
+            ' charset=iso-8859-1"></head><body><div>Edgar Mej\xeda</div>'
+            '</body></html>',
+        ]
+        for html in pages:
+            for name in ('beautifulsoup', 'lxml'):
+                soup = backends.get_backend(name).parse(html)
+                self.assertEqual(soup.find('div').string, u'Edgar Mej\xeda')
+
+    def test_partial_parse_matches_full_parse(self):
+        ''' Building only the regions the getters read shouldn't change what
+        comes out of them, whichever backend does the parsing
+        '''
+        expected = summarize_game(parser.MLSStatsParser(
+            self.url, transport=self.transport).game)
+        names = ['beautifulsoup']
+        if backends.etree is not None:
+            names.append('lxml')
+        for name in names:
+            stats_parser = parser.MLSStatsParser(
+                self.url, backend=name, partial=True,
+                transport=self.transport)
+            self.assertEqual(
+                summarize_game(stats_parser.game), expected)
+            assert not stats_parser.stat_html.find('head')
+
+    def test_unknown_backend(self):
+        self.assertRaises(ValueError, backends.get_backend, 'nope')
+
+
+@unittest.skipIf(season.numpy is None, 'numpy is not installed')
+class TestSeasonStore(unittest.TestCase):
+
+    def setUp(self):
+        super(TestSeasonStore, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        with StubServer() as server, Transport() as transport:
+            self.game = parser.MLSStatsParser(server.url(
+                'matchcenter/2013-03-24-CHI-v-CHV/stats'),
+                transport=transport).game
+        self.store = season.SeasonStore()
+        self.store.add_game(self.game, 'first')
+        self.store.add_game(self.game, 'second')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(TestSeasonStore, self).tearDown()
+
+    def _by_player(self, results, stat, name):
+        return results[stat][list(results['player']).index(name)]
+
+    def test_rows(self):
+        self.assertEqual(len(self.store.matches), 2)
+        self.assertEqual(
+            len(self.store.players), 2 * (
+                len(self.game.home_team.players) +
+                len(self.game.away_team.players)))
+        self.assertEqual(len(self.store.goals), 10)
+        self.assertEqual(
+            self.store.names(self.store.matches['home_team']),
+            ['Chicago Fire', 'Chicago Fire'])
+
+    def test_player_totals(self):
+        totals = self.store.player_totals()
+        self.assertEqual(
+            self._by_player(totals, 'appearances', 'Austin Berry'), 2)
+        self.assertEqual(
+            self._by_player(totals, 'minutes', 'Austin Berry'), 180)
+        self.assertEqual(
+            self._by_player(totals, 'fouls_suffered', 'Austin Berry'), 6)
+
+        rates = self.store.per_90(totals=totals)
+        self.assertEqual(
+            self._by_player(rates, 'fouls_suffered', 'Austin Berry'), 3)
+
+    def test_per_90_for_some_stats(self):
+        rates = self.store.per_90(stats=('fouls_suffered',))
+        self.assertEqual(sorted(rates), ['fouls_suffered', 'player'])
+        self.assertEqual(
+            self._by_player(rates, 'fouls_suffered', 'Austin Berry'), 3)
+
+    def test_registry_joins_spellings(self):
+        registry = PlayerRegistry()
+        store = season.SeasonStore(registry=registry)
+        store.add_game(self.game)
+        berry = self.game.home_team.starters[0]
+        mejia = self.game.goals[0].player
+        names = berry.page_name, mejia.page_name
+        berry.page_name = u'Austin BERRY'
+        mejia.page_name = u'Edgar Mej\xeda-'
+        try:
+            store.add_game(self.game)
+        finally:
+            berry.page_name, mejia.page_name = names
+
+        totals = store.player_totals()
+        self.assertEqual(
+            self._by_player(totals, 'appearances', 'Austin Berry'), 2)
+        assert 'Austin BERRY' not in totals['player']
+        self.assertEqual(
+            store.names(store.goals['player'][[0, 5]]),
+            [u'Edgar Mej\xeda', u'Edgar Mej\xeda'])
+
+    def test_load_with_registry(self):
+        registry = PlayerRegistry()
+        store = season.SeasonStore(registry=registry)
+        store.add_game(self.game)
+        path = os.path.join(self.tmp_dir, 'season.npz')
+        store.save(path)
+
+        loaded = season.SeasonStore.load(path, registry=registry)
+        assert loaded.registry is registry
+        berry = self.game.home_team.starters[0]
+        page_name, berry.page_name = berry.page_name, u'Austin BERRY'
+        try:
+            loaded.add_game(self.game)
+        finally:
+            berry.page_name = page_name
+        totals = loaded.player_totals()
+        self.assertEqual(
+            self._by_player(totals, 'appearances', 'Austin Berry'), 2)
+        assert 'Austin BERRY' not in totals['player']
+
+    def test_team_possession(self):
+        possession = self.store.team_possession()
+        self.assertEqual(
+            sorted(zip(possession['team'], possession['possession'])),
+            [('Chicago Fire', 56.9), ('Chivas USA', 43.1)])
+
+    def test_save_and_load(self):
+        path = os.path.join(self.tmp_dir, 'season.npz')
+        self.store.save(path)
+        loaded = season.SeasonStore.load(path)
+        self.assertEqual(loaded.strings, self.store.strings)
+        for table, columns in season.TABLES:
+            for name, dtype in columns:
+                self.assertEqual(
+                    getattr(loaded, table)[name].tolist(),
+                    getattr(self.store, table)[name].tolist())
+
+        loaded.add_game(self.game, 'third')
+        self.assertEqual(
+            loaded.player_totals()['appearances'].max(), 3)
+
+
+class TestMatchArchive(unittest.TestCase):
+
+    def setUp(self):
+        super(TestMatchArchive, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'matches.arc')
+        with StubServer() as server, Transport() as transport:
+            self.game = parser.MLSStatsParser(server.url(
+                'matchcenter/2013-03-24-CHI-v-CHV/stats'),
+                transport=transport).game
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(TestMatchArchive, self).tearDown()
+
+    def _fill(self, count):
+        start = self.game.game_date
+        with MatchArchive(self.path) as archive:
+            for day in range(count):
+                self.game.game_date = start + timedelta(days=day)
+                archive.append(self.game, 'match-%s' % day)
+        self.game.game_date = start
+
+    def test_round_trip(self):
+        self._fill(1)
+        with MatchArchive(self.path) as archive:
+            self.assertEqual(len(archive), 1)
+            assert 'match-0' in archive
+            game = archive.get('match-0')
+        self.assertEqual(summarize_game(game), summarize_game(self.game))
+        assert game.goals[1].player is game.home_team.get_player(
+            'Patrick Nyarko')
+        self.assertEqual(
+            [x.page_name for x in game.home_team.players],
+            [x.page_name for x in self.game.home_team.players])
+
+    def test_date_range(self):
+        self._fill(10)
+        start = self.game.game_date
+        with MatchArchive(self.path) as archive:
+            games = list(archive.between(
+                start + timedelta(days=3), start + timedelta(days=6)))
+            self.assertRaises(KeyError, archive.get, 'match-10')
+        self.assertEqual(
+            [x.game_date for x in games],
+            [start + timedelta(days=x) for x in (3, 4, 5)])
+
+    def test_appends_after_reopening(self):
+        self._fill(2)
+        with MatchArchive(self.path) as archive:
+            self.game.home_team.name = 'Chicago Fire SC'
+            archive.append(self.game, 'match-1')
+            archive.append(self.game, 'match-2')
+        with MatchArchive(self.path) as archive:
+            self.assertEqual(len(archive), 3)
+            self.assertEqual(
+                archive.get('match-1').home_team.name, 'Chicago Fire SC')
+            self.assertEqual(
+                archive.get('match-0').home_team.name, 'Chicago Fire')
+
+    def test_ignores_interrupted_append(self):
+        self._fill(2)
+        with open(self.path + '.idx', 'ab') as index:
+            index.write('\0' * (INDEX_RECORD.size // 2))
+        with MatchArchive(self.path) as archive:
+            self.assertEqual(len(archive), 2)
+            archive.append(self.game, 'match-2')
+        with MatchArchive(self.path) as archive:
+            self.assertEqual(len(archive), 3)
+            self.assertEqual(
+                archive.get('match-2').home_team.name, 'Chicago Fire')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,125 @@
+import time
+import logging
+import threading
+from urlparse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from log import LOGGER_NAME
+
+
+class RateLimiter(object):
+    ''' Enforces a minimum interval between requests to the same host. Safe
+    to share between threads; each caller reserves the next free slot for its
+    host and then sleeps until that slot comes around.
+    '''
+
+    def __init__(self, min_interval=0, clock=time.time, sleep=time.sleep):
+        self.min_interval = min_interval
+        self._clock = clock
+        self._sleep = sleep
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        if not self.min_interval:
+            return
+
+        with self._lock:
+            now = self._clock()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+
+        if slot > now:
+            self._sleep(slot - now)
+
+
+class Transport(object):
+    ''' The HTTP layer used by the parsers to fetch pages.
+
+    Wraps a single requests Session so connections are kept alive and reused
+    across pages and matches. Timeouts, connection errors and 5xx responses
+    are retried up to `retries` times, sleeping
+    `backoff_factor * 2 ** attempt` seconds (capped at `max_backoff`) in
+    between. Requests to the same host are spaced at least `min_interval`
+    seconds apart.
+
+    A Transport is safe to share between parsers running on different
+    threads, which is the whole point of it.
+    '''
+
+    def __init__(self, session=None, retries=3, backoff_factor=0.5,
+                 max_backoff=30, timeout=30, min_interval=0, pool_size=20,
+                 logger=None, sleep=time.sleep):
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(min_interval, sleep=sleep)
+        self.logger = logger if logger else logging.getLogger(
+            '%s.transport' % LOGGER_NAME)
+        self._sleep = sleep
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        ''' Closes the kept-alive connections '''
+        self.session.close()
+
+    def _backoff(self, attempt):
+        return min(self.max_backoff, self.backoff_factor * (2 ** attempt))
+
+    def get(self, url, headers=None):
+        ''' Fetches url, retrying transient failures. The last response is
+        returned once retries run out, even if it's a 5xx, so callers can
+        report the status code.
+        '''
+        host = urlparse(url).netloc
+        attempt = 0
+        while True:
+            self.rate_limiter.wait(host)
+            try:
+                resp = self.session.get(
+                    url, headers=headers, timeout=self.timeout)
+            except (requests.Timeout, requests.ConnectionError):
+                if attempt >= self.retries:
+                    raise
+                self.logger.warning(
+                    'Attempt %s for %s failed', attempt + 1, url,
+                    exc_info=True)
+            else:
+                if resp.status_code < 500 or attempt >= self.retries:
+                    return resp
+                self.logger.warning(
+                    'Attempt %s for %s returned a %s status code',
+                    attempt + 1, url, resp.status_code)
+
+            self._sleep(self._backoff(attempt))
+            attempt += 1
+
+
+_default_transport = None
+_default_transport_lock = threading.Lock()
+
+
+def get_default_transport():
+    ''' Returns the Transport shared by every parser that wasn't handed one
+    explicitly, creating it on first use.
+    '''
+    global _default_transport
+    with _default_transport_lock:
+        if _default_transport is None:
+            _default_transport = Transport()
+        return _default_transport
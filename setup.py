@@ -23,7 +23,9 @@ setup(
     zip_safe=False,
     install_requires=install_requires,
     include_package_data=True,
-    entry_points={},
+    entry_points={
+        'console_scripts': ['mls-scraper = mls_scraper.cli:main'],
+    },
     test_suite='nose.collector',
     setup_requires=['nose>=1.0'],
     classifiers=[